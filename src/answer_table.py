@@ -0,0 +1,180 @@
+"""
+Precompute the best foods and drinks for every set of numbered areas
+"""
+
+import array
+import concurrent.futures
+import disk_cache
+import json
+import mmap
+import os
+import struct
+import ingredient_index
+import item_store
+import ranking
+import recipe_compiler
+
+# Stats which are ranked for every set of areas
+STATS = ['Heal', 'SpRestore']
+
+# Marks an empty slot when fewer items are available than the result count
+EMPTY_SLOT = 0xFFFF
+
+# Identifies a saved table, followed by its result count and the length of its consumable ids
+MAGIC = b'ERAT'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+
+# Tables used by the worker processes, set once when each worker starts
+_worker_tables = {}
+
+
+class AnswerTable:
+    def __init__(self, consumables: list, result_count: int, slots: array.array):
+        """
+        Best items for every set of areas, stored as positions in the consumable list in one flat array
+
+        :param consumables: Item ids of the consumables
+        :param result_count: The number of items stored for each list
+        :param slots: Consumable positions of the best items for every area set, stat and list type, as an array or
+                      memory view
+        """
+        # Public variables
+        self.consumables = consumables
+        self.result_count = result_count
+
+        # Private variables
+        self.__slots = slots
+
+    def lookup(self, area_subset: int, stat: str, list_type: str) -> list:
+        """
+        Get the ids of the best items for the set of areas
+
+        :param area_subset: Mask with the bit of each area number visited set
+        :param stat: The stat to compare
+        :param list_type: The type of list E.g. Total, Single, Balanced
+        """
+        start = _get_slot_start(area_subset, stat, list_type, self.result_count)
+        return [self.consumables[position] for position in self.__slots[start:start + self.result_count]
+                if position != EMPTY_SLOT]
+
+    def save(self, file_name: str):
+        """
+        Save the table so other processes can memory map it instead of building their own
+
+        :param file_name: Path of the table file
+        """
+        consumables = json.dumps(list(self.consumables)).encode()
+
+        # Pad the ids so the slots start on a two byte boundary
+        consumables += b' ' * (len(consumables) % 2)
+        with disk_cache.atomic_write(file_name, 'wb') as output_file:
+            output_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.result_count, len(consumables)))
+            output_file.write(consumables)
+            output_file.write(array.array('H', self.__slots).tobytes())
+
+
+def build_answer_table(snapshot, result_count: int = 5, processes: int = None) -> AnswerTable:
+    """
+    Rank every set of areas across a pool of processes
+
+    :param snapshot: GameDataSnapshot to rank the items from
+    :param result_count: The number of items to store for each list
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    """
+    subset_count = 1 << len(ingredient_index.NUMBERED_AREAS)
+    processes = processes or os.cpu_count() or 1
+    chunk_size = -(-subset_count // (processes * 4))
+    starts = range(0, subset_count, chunk_size)
+    ends = [min(start + chunk_size, subset_count) for start in starts]
+    slots = array.array('H')
+
+    # Plain dictionaries so they can be sent to the workers
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=_init_worker,
+                                                initargs=(dict(snapshot.items), dict(snapshot.areas))) as executor:
+        for chunk in executor.map(_rank_subsets, starts, ends, [result_count] * len(starts)):
+            slots.frombytes(chunk)
+
+    return AnswerTable(snapshot.ingredient_index.consumables, result_count, slots)
+
+
+def load_answer_table(file_name: str) -> AnswerTable:
+    """
+    Memory map a table saved by AnswerTable.save, sharing its pages with every other process which maps it
+
+    :param file_name: Path of the table file
+    """
+    with open(file_name, 'rb') as input_file:
+        buffer = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, result_count, consumables_length = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f'{file_name} is not a version {FORMAT_VERSION} answer table')
+    consumables = json.loads(buffer[HEADER.size:HEADER.size + consumables_length].decode())
+    slots = memoryview(buffer)[HEADER.size + consumables_length:].cast('H')
+    return AnswerTable(consumables, result_count, slots)
+
+
+def _get_slot_start(area_subset: int, stat: str, list_type: str, result_count: int) -> int:
+    """
+    Get where the items for the set of areas, stat and list type start in the flat array
+
+    :param area_subset: Mask with the bit of each area number visited set
+    :param stat: The stat to compare
+    :param list_type: The type of list E.g. Total, Single, Balanced
+    :param result_count: The number of items stored for each list
+    """
+    lists_per_subset = len(STATS) * len(ranking.TOP_LIST_TYPES)
+    list_number = STATS.index(stat) * len(ranking.TOP_LIST_TYPES) + ranking.TOP_LIST_TYPES.index(list_type)
+    return (area_subset * lists_per_subset + list_number) * result_count
+
+
+def _init_worker(items: dict, areas: dict):
+    """
+    Compile the tables once for each worker process
+
+    :param items: Dictionary of every item keyed by the item name
+    :param areas: Dictionary of the items spawning in each area keyed by the area name
+    """
+    store = item_store.ItemStore(items)
+    recipes = recipe_compiler.CompiledRecipes(store)
+    index = ingredient_index.IngredientIndex(store, areas, recipes)
+    _worker_tables.update({
+        'items': store,
+        'index': index,
+        'positions': {item_id: cnt for cnt, item_id in enumerate(index.consumables)},
+        'ranking': ranking.RankingEngine(store, recipes),
+        'ranked': {}
+    })
+
+
+def _rank_subsets(start: int, end: int, result_count: int) -> bytes:
+    """
+    Rank every set of areas in the range
+
+    :param start: First area set mask to rank
+    :param end: Area set mask to stop before
+    :param result_count: The number of items to store for each list
+    :return: The slots for the range as bytes
+    """
+    items = _worker_tables['items']
+    index = _worker_tables['index']
+    positions = _worker_tables['positions']
+    ranking_engine = _worker_tables['ranking']
+    ranked = _worker_tables['ranked']
+    slots = array.array('H')
+    for area_subset in range(start, end):
+        available = index.get_subset_available_mask(area_subset)
+
+        # Many sets of areas spawn the same ingredients, so only rank each combination once
+        if available not in ranked:
+            feasible = index.get_feasible_consumables(available)
+            subset_slots = array.array('H')
+            for stat in STATS:
+                candidates = [item_id for item_id in feasible if items.has_stat(item_id, stat)]
+                rankings = ranking_engine.rank(candidates, stat, result_count)
+                for list_type in ranking.TOP_LIST_TYPES:
+                    best = [positions[item_id] for item_id in rankings[list_type]]
+                    subset_slots.extend(best + [EMPTY_SLOT] * (result_count - len(best)))
+            ranked[available] = subset_slots
+        slots.extend(ranked[available])
+    return slots.tobytes()
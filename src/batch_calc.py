@@ -0,0 +1,190 @@
+"""
+Score many paths at once, reading them from a file or stdin and writing the results as json lines
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import gc
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import game_data
+import path_calculator
+import snapshot_format
+
+# Number of paths sent to a worker at a time
+CHUNK_SIZE = 64
+
+
+def read_requests(input_file: object, list_type: str):
+    """
+    Read each path from the input, which can be plain lines of area numbers or json objects
+
+    :param input_file: File to read from, one path per line
+    :param list_type: List type to use when a line doesn't give one
+    :return: Generator of the line number, path, list type and error of each line, where the error is None unless the
+        line couldn't be read
+    """
+    for line_number, line in enumerate(input_file, 1):
+        line = line.strip()
+        if line == '' or line.startswith('#'):
+            continue
+        if not line.startswith('{'):
+            yield line_number, line, list_type, None
+            continue
+
+        # A line which can't be read gets an error in its place instead of stopping the batch
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as error:
+            yield line_number, None, list_type, f'Invalid json: {error}'
+            continue
+        path = request.get('path')
+        if isinstance(path, list):
+            path = ' '.join(str(area) for area in path)
+        if not isinstance(path, (str, int)):
+            yield line_number, None, list_type, 'Missing path, give it as a string or list of area numbers'
+        elif not isinstance(request.get('list_type', list_type), str):
+            yield line_number, str(path), list_type, 'The list type must be a string'
+        else:
+            yield line_number, str(path), request.get('list_type', list_type), None
+
+
+def calculate_path(line_number: int, path: str, list_type: str) -> dict:
+    """
+    Calculate a path with the loaded snapshot
+
+    :param line_number: Line of the input the path came from
+    :param path: Area numbers separated by spaces
+    :param list_type: The type of list to provide E.g. Total, Single, Balanced
+    :return: The best items as plain values along with the messages the bot would send
+    """
+    path_calc = path_calculator.PathCalc(path, list_type)
+    messages = path_calc.create_item_path(use_cache=False)
+    return {
+        'line': line_number,
+        'path': path_calc.path,
+        'list_type': path_calc.list_type,
+        'errors': messages['error'],
+        'foods': [path_calc.get_item_details(item_id, 'Heal') for item_id in path_calc.best_items.get('Heal', [])],
+        'drinks': [path_calc.get_item_details(item_id, 'SpRestore')
+                   for item_id in path_calc.best_items.get('SpRestore', [])],
+        'text': messages['info']
+    }
+
+
+def get_error_result(line_number: int, path: str, list_type: str, error: str) -> dict:
+    """
+    Get the result for a line which couldn't be read, in the same format as a calculated path
+
+    :param line_number: Line of the input
+    :param path: Path given on the line, if it could be read
+    :param list_type: List type the line would have used
+    :param error: Why the line couldn't be read
+    """
+    return {
+        'line': line_number,
+        'path': path,
+        'list_type': list_type,
+        'errors': [error],
+        'foods': [],
+        'drinks': [],
+        'text': []
+    }
+
+
+def _init_worker(snapshot_file_name: str):
+    """
+    Load the snapshot written by the main process, only used when workers can't be forked from it
+
+    :param snapshot_file_name: Binary snapshot written by the main process
+    """
+    game_data.store.load(snapshot_format.read_snapshot(snapshot_file_name))
+
+
+def _calculate_chunk(requests: list) -> str:
+    """
+    Calculate a chunk of paths in a worker process
+
+    :param requests: Line number, path, list type and error of each line
+    :return: The json line of each result
+    """
+    results = []
+    for line_number, path, list_type, error in requests:
+        if error is None:
+            results.append(calculate_path(line_number, path, list_type))
+        else:
+            results.append(get_error_result(line_number, path, list_type, error))
+    return ''.join(json.dumps(result) + '\n' for result in results)
+
+
+def run_batch(input_file: object, output_file: object, list_type: str = 'balanced', processes: int = None,
+              snapshot_file_name: str = None):
+    """
+    Calculate every path in the input across a pool of processes, writing the results in the same order
+
+    Only a few chunks are in flight at once, so memory stays the same no matter how large the input is.
+
+    :param input_file: File to read the paths from
+    :param output_file: File to write the json lines to
+    :param list_type: List type to use when a line doesn't give one
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :param snapshot_file_name: Binary snapshot to calculate with, defaults to the current game data
+    """
+    processes = processes or os.cpu_count() or 1
+    requests = read_requests(input_file, list_type)
+    if snapshot_file_name is not None:
+        game_data.store.load(snapshot_format.read_snapshot(snapshot_file_name))
+    snapshot = game_data.get_snapshot()
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+
+        # Forked workers share the snapshot already built here, so it is only loaded and built once for the batch
+        if 'fork' in multiprocessing.get_all_start_methods():
+            pool_options = {'mp_context': multiprocessing.get_context('fork')}
+
+            # Keep the garbage collector from touching the shared objects, which would copy them into every worker
+            gc.freeze()
+
+        # Otherwise each worker has to load and build its own copy from a file
+        else:
+            if snapshot_file_name is None:
+                snapshot_file_name = os.path.join(temp_directory, 'batch.snap')
+                snapshot_format.save_snapshot(snapshot.all_info, snapshot_file_name)
+            pool_options = {'initializer': _init_worker, 'initargs': (snapshot_file_name,)}
+
+        with concurrent.futures.ProcessPoolExecutor(processes, **pool_options) as executor:
+            pending = collections.deque()
+            while True:
+                chunk = list(itertools.islice(requests, CHUNK_SIZE))
+                if chunk:
+                    pending.append(executor.submit(_calculate_chunk, chunk))
+                if pending and (not chunk or len(pending) >= processes * 2):
+                    output_file.write(pending.popleft().result())
+                    output_file.flush()
+                elif not chunk:
+                    break
+        gc.unfreeze()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calculate the best items for many paths')
+    parser.add_argument('input', nargs='?', default='-', help='File with one path per line, or - for stdin')
+    parser.add_argument('--output', default='-', help='File to write the json lines to, or - for stdout')
+    parser.add_argument('--list-type', default='balanced', help='List type for lines which don\'t give one')
+    parser.add_argument('--processes', type=int, help='Number of worker processes')
+    parser.add_argument('--data', help='Json api results or binary snapshot to use instead of the current data')
+    arguments = parser.parse_args()
+
+    if arguments.data is not None and arguments.data.endswith('.json'):
+        with open(arguments.data, 'r') as data_file:
+            game_data.store.load(json.load(data_file))
+        arguments.data = None
+
+    with (sys.stdin if arguments.input == '-' else open(arguments.input, 'r')) as batch_input, \
+            (sys.stdout if arguments.output == '-' else open(arguments.output, 'w')) as batch_output:
+        run_batch(batch_input, batch_output, arguments.list_type, arguments.processes, arguments.data)
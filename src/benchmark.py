@@ -0,0 +1,308 @@
+"""
+Benchmarks for the path calculator and loading the game data, using synthetic data sets to see how they scale
+"""
+
+import argparse
+import disk_cache
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import game_data
+import ingredient_index
+import path_calculator
+import ranking
+import snapshot_format
+
+# Ingredients every data set has, matching the ones added to every area by EternalReturnApi
+BASIC_INGREDIENTS = {
+    'Stone': 'Material',
+    'Branch': 'Material',
+    'Meat': 'Food',
+    'Bread': 'Food',
+    'Water': 'Beverage'
+}
+
+# Slower than this much of the baseline counts as a regression
+REGRESSION_THRESHOLD = 1.25
+
+# Code run in a fresh interpreter for each way of loading the game data
+LOAD_SCRIPTS = {
+    'python startup': 'pass',
+    'json': 'import json\n'
+            'with open(file_names["json"]) as input_file:\n'
+            '    all_info = json.load(input_file)',
+    'binary (lazy)': 'import snapshot_format\n'
+                     'all_info = snapshot_format.BinarySnapshot(file_names["binary"]).get_all_info()',
+    'binary (decoded)': 'import snapshot_format\n'
+                        'all_info = snapshot_format.BinarySnapshot(file_names["binary"]).get_all_info()\n'
+                        'dict(all_info["items"]), dict(all_info["areas"])'
+}
+
+# Wraps each load script to time it and report the resident memory of the process afterwards
+MEASURE_SCRIPT = '''
+import json, sys, time
+sys.path.insert(0, {source_dir!r})
+file_names = {file_names!r}
+start_time = time.perf_counter()
+{load_script}
+load_time = time.perf_counter() - start_time
+try:
+    with open('/proc/self/status') as status_file:
+        resident_memory = int(status_file.read().split('VmRSS:')[1].split()[0])
+except (OSError, IndexError):
+    resident_memory = None
+print(json.dumps({{'seconds': load_time, 'rss_kb': resident_memory}}))
+'''
+
+
+def benchmark_snapshot_load(json_file_name: str, repeats: int = 10) -> dict:
+    """
+    Compare loading the json api results against the binary snapshot, each in a fresh interpreter
+
+    :param json_file_name: Path of the json api results
+    :param repeats: Number of times to load each format
+    :return: Median load time and resident memory for each format
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_names = {'json': json_file_name, 'binary': os.path.join(temp_dir, 'api_results.snap')}
+        snapshot_format.import_json(json_file_name, file_names['binary'])
+
+        for name, load_script in LOAD_SCRIPTS.items():
+            runs = []
+            for _ in range(repeats):
+                script = MEASURE_SCRIPT.format(source_dir=os.path.dirname(os.path.abspath(__file__)),
+                                               file_names=file_names, load_script=load_script)
+                output = subprocess.run([sys.executable, '-c', script], capture_output=True, check=True, text=True)
+                runs.append(json.loads(output.stdout))
+            results[name] = {
+                'median_ms': statistics.median(run['seconds'] for run in runs) * 1000,
+                'rss_kb': None if runs[0]['rss_kb'] is None else statistics.median(run['rss_kb'] for run in runs)
+            }
+        results['file_bytes'] = {name: os.path.getsize(file_name) for name, file_name in file_names.items()}
+    return results
+
+
+def generate_dataset(item_count: int = 500, recipe_depth: int = 3, area_count: int = 16, spawn_density: float = 0.3,
+                     seed: int = 0) -> dict:
+    """
+    Create api results with random foods and drinks in the same format as EternalReturnApi.all_info_dict
+
+    :param item_count: Total number of items
+    :param recipe_depth: Most crafting steps needed for an item
+    :param area_count: Number of areas, the first ones using the real area names so paths can be given by number
+    :param spawn_density: Chance of each base ingredient spawning in each area
+    :param seed: Seed for the random numbers so the same options always give the same data set
+    """
+    rng = random.Random(seed)
+    items = {}
+
+    def add_item(name: str, item_type: str, material_1: str = '', material_2: str = ''):
+        stat_value = rng.randrange(50, 1000, 10)
+        items[name] = {
+            'Name': name,
+            'ItemType': item_type,
+            'Heal': stat_value if item_type == 'Food' else '',
+            'SpRestore': stat_value if item_type == 'Beverage' else '',
+            'Material1': material_1,
+            'Material2': material_2,
+            'InitialCount': rng.randint(1, 5)
+        }
+
+    for name, item_type in BASIC_INGREDIENTS.items():
+        add_item(name, item_type)
+
+    # Split the items evenly between the base ingredients and each level of crafting
+    per_level = max(1, (item_count - len(items)) // (recipe_depth + 1))
+    levels = [[]]
+    for cnt in range(per_level):
+        levels[0].append(f'Ingredient {cnt}')
+        add_item(levels[0][-1], rng.choice(['Food', 'Beverage']))
+    levels[0] += list(BASIC_INGREDIENTS)
+
+    # Each crafted item uses something from the level below so it really needs that many steps
+    for depth in range(1, recipe_depth + 1):
+        lower_items = [name for level in levels for name in level]
+        levels.append([])
+        count = per_level if depth < recipe_depth else item_count - len(items)
+        for cnt in range(max(count, 0)):
+            levels[-1].append(f'Crafted {depth}-{cnt}')
+            add_item(levels[-1][-1], rng.choice(['Food', 'Beverage']), rng.choice(levels[depth - 1]),
+                     rng.choice(lower_items))
+
+    area_names = ingredient_index.NUMBERED_AREAS[:area_count] + \
+        [f'Area {cnt}' for cnt in range(len(ingredient_index.NUMBERED_AREAS), area_count)]
+    areas = {}
+    for area in area_names:
+        areas[area] = {name: rng.randint(1, 9) for name in levels[0][:per_level] if rng.random() < spawn_density}
+        for name in ['Stone', 'Branch', 'Meat']:
+            areas[area][name] = 99
+
+    return {
+        'items': items,
+        'areas': areas,
+        'characters': {},
+        '__timestamp': int(time.time())
+    }
+
+
+def benchmark_path_calc(all_info: dict, iterations: int = 200, path_length: int = 3, seed: int = 0) -> dict:
+    """
+    Time each phase of PathCalc.create_item_path along with loading and compiling the data set
+
+    :param all_info: Api results to calculate with
+    :param iterations: Number of random paths to calculate
+    :param path_length: Number of areas in each path
+    :param seed: Seed for choosing the paths
+    :return: Dictionary of each phase to the seconds each run of it took
+    """
+    rng = random.Random(seed)
+    timings = {}
+
+    def timed(phase: str, function: callable):
+        start_time = time.perf_counter()
+        result = function()
+        timings.setdefault(phase, []).append(time.perf_counter() - start_time)
+        return result
+
+    dumped = json.dumps(all_info)
+    for _ in range(max(1, iterations // 10)):
+        timed('json_load', lambda: json.loads(dumped))
+        snapshot = timed('snapshot_build', lambda: game_data.GameDataSnapshot(all_info, 0))
+    game_data.store.load(all_info)
+
+    area_numbers = [str(cnt) for cnt in range(min(len(ingredient_index.NUMBERED_AREAS), len(snapshot.areas)))]
+    for _ in range(iterations):
+        path = ' '.join(rng.sample(area_numbers, min(path_length, len(area_numbers))))
+        path_calc = path_calculator.PathCalc(path, 'balanced')
+        timed('get_given_path', path_calc.get_given_path)
+        timed('get_all_food_and_drink', path_calc.get_all_food_and_drink)
+        timed('get_ingredients', path_calc.get_ingredients)
+        for stat in ['Heal', 'SpRestore']:
+            timed('get_possible_items', lambda: path_calc.get_possible_items(stat))
+            for list_type in ranking.TOP_LIST_TYPES:
+                best_items = timed(f'rank_{list_type}', lambda: path_calc.ranking.rank(
+                    path_calc.possible_items, stat, path_calc.result_count)[list_type])
+            timed('rank_pareto', lambda: path_calc.ranking.get_pareto(path_calc.possible_items, stat))
+            timed('rank_expected', lambda: path_calc.yield_model.rank(path_calc.possible_items, path_calc.area_subset,
+                                                                      stat, path_calc.result_count))
+            timed('create_message', lambda: path_calc.create_message(best_items, 'Best Items To Create:', stat))
+    return timings
+
+
+def summarize(timings: dict) -> dict:
+    """
+    Get the throughput and percentiles of each phase
+
+    :param timings: Dictionary of each phase to the seconds each run of it took
+    """
+    def percentile(values: list, percent: int) -> float:
+        return values[min(len(values) - 1, round(percent / 100 * (len(values) - 1)))]
+
+    summary = {}
+    for phase, values in timings.items():
+        values = sorted(values)
+        mean = statistics.mean(values)
+        summary[phase] = {
+            'runs': len(values),
+            'per_second': 1 / mean if mean else 0,
+            'p50_us': percentile(values, 50) * 1e6,
+            'p90_us': percentile(values, 90) * 1e6,
+            'p99_us': percentile(values, 99) * 1e6
+        }
+    return summary
+
+
+def compare_to_baseline(summary: dict, baseline_file_name: str, data_set_key: str, save: bool) -> dict:
+    """
+    Get how much slower each phase is than the stored baseline, saving the summary as the new baseline if asked
+
+    :param summary: Results from summarize
+    :param baseline_file_name: Json file holding the baselines of each data set
+    :param data_set_key: Name of the data set options the baseline is for
+    :param save: Replace the stored baseline with this summary
+    :return: Dictionary of each phase to its p50 divided by the baseline p50
+    """
+    baselines = {}
+    if os.path.isfile(baseline_file_name):
+        with open(baseline_file_name, 'r') as input_file:
+            baselines = json.load(input_file)
+
+    baseline = baselines.get(data_set_key, {})
+    ratios = {phase: result['p50_us'] / baseline[phase]['p50_us'] for phase, result in summary.items()
+              if phase in baseline and baseline[phase]['p50_us']}
+
+    if save:
+        baselines[data_set_key] = summary
+        with disk_cache.atomic_write(baseline_file_name) as output_file:
+            json.dump(baselines, output_file, indent=4, sort_keys=True)
+    return ratios
+
+
+def print_path_calc(summary: dict, ratios: dict):
+    """
+    Print the results of the path calculator benchmark
+
+    :param summary: Results from summarize
+    :param ratios: Results from compare_to_baseline
+    """
+    print(f'{"Phase":<24}{"Runs":>8}{"Per sec":>12}{"p50 (us)":>12}{"p90 (us)":>12}{"p99 (us)":>12}{"vs base":>10}')
+    for phase, result in summary.items():
+        ratio = f'{ratios[phase]:.2f}x' if phase in ratios else '-'
+        flag = '  REGRESSION' if ratios.get(phase, 0) > REGRESSION_THRESHOLD else ''
+        print(f'{phase:<24}{result["runs"]:>8}{result["per_second"]:>12.0f}{result["p50_us"]:>12.1f}'
+              f'{result["p90_us"]:>12.1f}{result["p99_us"]:>12.1f}{ratio:>10}{flag}')
+
+
+def print_snapshot_load(results: dict):
+    """
+    Print the results of the snapshot load benchmark
+
+    :param results: Results from benchmark_snapshot_load
+    """
+    print(f'{"Format":<20}{"Load (ms)":>12}{"RSS (KB)":>12}')
+    for name, result in results.items():
+        if name != 'file_bytes':
+            print(f'{name:<20}{result["median_ms"]:>12.2f}{result["rss_kb"] or 0:>12}')
+    for name, size in results['file_bytes'].items():
+        print(f'{name} file: {size} bytes')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Eternal Return bot')
+    parser.add_argument('benchmark', choices=['pathcalc', 'snapshot'], help='Which benchmark to run')
+    parser.add_argument('--json-file', default=disk_cache.get_cache_file('api_results.json'),
+                        help='Json api results to load')
+    parser.add_argument('--repeats', type=int, default=10, help='Number of times to repeat each measurement')
+    parser.add_argument('--items', type=int, default=500, help='Number of items in the synthetic data set')
+    parser.add_argument('--depth', type=int, default=3, help='Most crafting steps in the synthetic data set')
+    parser.add_argument('--areas', type=int, default=16, help='Number of areas in the synthetic data set')
+    parser.add_argument('--density', type=float, default=0.3, help='Chance of an ingredient spawning in an area')
+    parser.add_argument('--real-data', action='store_true', help='Use the json api results instead of synthetic data')
+    parser.add_argument('--iterations', type=int, default=200, help='Number of paths to calculate')
+    parser.add_argument('--path-length', type=int, default=3, help='Number of areas in each path')
+    parser.add_argument('--baseline-file', default=disk_cache.get_cache_file('benchmark_baseline.json'),
+                        help='Json file the baselines are stored in')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    arguments = parser.parse_args()
+
+    if arguments.benchmark == 'pathcalc':
+        if arguments.real_data:
+            with open(arguments.json_file, 'r') as json_file:
+                data_set = json.load(json_file)
+            key = 'real'
+        else:
+            data_set = generate_dataset(arguments.items, arguments.depth, arguments.areas, arguments.density)
+            key = f'items={arguments.items} depth={arguments.depth} areas={arguments.areas} ' \
+                  f'density={arguments.density}'
+        key += f' path_length={arguments.path_length}'
+        results = summarize(benchmark_path_calc(data_set, arguments.iterations, arguments.path_length))
+        print(f'Data set: {key}')
+        print_path_calc(results, compare_to_baseline(results, arguments.baseline_file, key, arguments.save_baseline))
+    else:
+        print_snapshot_load(benchmark_snapshot_load(arguments.json_file, arguments.repeats))
@@ -0,0 +1,130 @@
+"""
+Check which parts of a build of any item type can be crafted along a path, and where to find what is missing
+"""
+
+import ingredient_index
+import path_calculator
+
+
+class BuildCalc(path_calculator.PathCalc):
+    def __init__(self, build_arguments: str):
+        """
+        What the build calculator should find out.
+
+        :param build_arguments: Area numbers followed by the names of the items in the build, separated by commas
+                                E.g. 2 14 15 Chain Legs, Mithril Armor
+        """
+        arguments = build_arguments.split()
+        path_length = 0
+        while path_length < len(arguments) and arguments[path_length].isdigit():
+            path_length += 1
+        super().__init__(' '.join(arguments[:path_length]), 'total')
+
+        # Public variables
+        self.build = []
+        self.solutions = {}
+
+        # Private variables
+        self.__build_names = [name.strip() for name in ' '.join(arguments[path_length:]).split(',') if name.strip()]
+
+    def create_build(self):
+        """
+        Solve every item in the build and create a message for each one, followed by everything the build needs
+        """
+        if self.sanity_check():
+            self.get_given_path()
+            self.solutions = self.crafting_solver.solve(self.build, self.is_gatherable)
+            for item_id in self.build:
+                self.create_build_message(item_id)
+            self.create_summary_message()
+        return self.messages
+
+    def sanity_check(self) -> bool:
+        """
+        Verify the build has at least one known item
+        """
+        if not self.__build_names:
+            self.messages['error'].append('List the items in the build after the areas, separated by commas')
+        for name in self.__build_names:
+            item_id = self.crafting_solver.get_item_id(name)
+            if item_id is None:
+                self.messages['error'].append(f'Unknown item {name}')
+            elif item_id not in self.build:
+                self.build.append(item_id)
+        return len(self.build) > 0
+
+    def is_gatherable(self, item_id: int) -> bool:
+        """
+        Check if the item can be picked up along the path
+
+        :param item_id: Id of the item
+        """
+        return self.ingredient_index.is_gatherable(item_id, self.area_subset)
+
+    def create_build_message(self, item_id: int):
+        """
+        Create the message for a single item of the build
+
+        :param item_id: Id of the item
+        """
+        solution = self.solutions[item_id]
+        final_string = f'**{self.items.names[item_id]}** ({self.items.get_type(item_id)})\n'
+        if solution.craftable:
+            final_string += 'Craftable\n'
+        else:
+            final_string += f'Missing: {", ".join(self.items.names[leaf] for leaf in solution.missing)}\n'
+            if solution.parts:
+                final_string += f'Craftable Parts: {", ".join(self.items.names[part] for part in solution.parts)}\n'
+        if solution.gather:
+            final_string += f'{self.get_gather_string(solution.gather)}\n'
+        self.messages['info'].append(final_string)
+
+    def create_summary_message(self):
+        """
+        Create the message with everything to gather for the whole build and where to find what is missing
+        """
+        gather = {}
+        missing = {}
+        for item_id in self.build:
+            for counts, item_counts in [(gather, self.solutions[item_id].gather),
+                                        (missing, self.solutions[item_id].missing)]:
+                for leaf, count in item_counts.items():
+                    counts[leaf] = counts.get(leaf, 0) + count
+
+        final_string = f'**Gather For The Build:**\n{self.get_gather_string(gather) or "Nothing"}\n'
+        if missing:
+            final_string += '**Missing From The Path:**\n'
+            for leaf in missing:
+                final_string += f'{self.items.names[leaf]}: {self.get_spawn_areas_string(leaf)}\n'
+        self.messages['info'].append(final_string)
+
+    def get_gather_string(self, gather: dict) -> str:
+        """
+        Get a string of each item to pick up and where it is along the path
+
+        :param gather: Count of each item to pick up, keyed by item id
+        """
+        return ', '.join(f'{self.items.names[leaf]}{f" x{count}" if count > 1 else ""} '
+                         f'({self.get_ingredient_areas_for_output(leaf)})' for leaf, count in gather.items())
+
+    def get_spawn_areas_string(self, item_id: int) -> str:
+        """
+        Get a string of every numbered area the item spawns in, to show where to go for one missing from the path
+
+        :param item_id: Id of the item
+        :return: The areas with their numbers E.g. Hotel 10, Pond 11
+        """
+        spawn_mask = self.ingredient_index.spawn_masks[item_id]
+        areas = [f'{area} {number}' for number, area in enumerate(ingredient_index.NUMBERED_AREAS)
+                 if spawn_mask >> number & 1]
+        return ', '.join(areas) or 'Not found in any area'
+
+
+if __name__ == '__main__':
+    build_calc = BuildCalc('2 14 15 Chain Legs, Mithril Armor').create_build()
+    for message_type_main in build_calc:
+        for message_main in build_calc[message_type_main]:
+            if message_type_main == 'error':
+                print(f'ERROR - {message_main}')
+            else:
+                print(message_main)
@@ -0,0 +1,218 @@
+"""
+Rate limit commands for each user and guild and take turns between guilds so no one can starve the others
+"""
+
+import asyncio
+import collections
+import sys
+import time
+import metrics
+
+# Buckets are only pruned once there are this many, removing the ones which have refilled
+MAX_IDLE_BUCKETS = 10000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        """
+        Allow bursts of up to the capacity, refilling at the given rate
+
+        :param rate: Tokens added each second
+        :param capacity: Most tokens the bucket can hold
+        """
+        # Public variables
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.limited = False
+
+    def has_token(self) -> bool:
+        """
+        Check if there is a token to take without taking it
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return self.tokens >= 1
+
+    def take(self) -> bool:
+        """
+        Take a token if there is one
+
+        :return: True if a token was taken
+        """
+        if self.has_token():
+            self.tokens -= 1
+            self.limited = False
+            return True
+        return False
+
+    def is_full(self) -> bool:
+        """
+        Check if the bucket has refilled, meaning it can be forgotten without changing anything
+        """
+        return self.tokens + (time.monotonic() - self.updated_at) * self.rate >= self.capacity
+
+
+class CommandContext:
+    def __init__(self, message: object, command: str, arguments: list):
+        """
+        Everything about a single command, passed along with it instead of being stored on the bot
+
+        :param message: The discord message the command came from
+        :param command: Name of the command without the prefix E.g. er
+        :param arguments: Words after the command
+        """
+        # Public variables
+        self.message = message
+        self.command = command
+        self.arguments = arguments
+        self.channel = message.channel
+        self.user_object = message.author
+        self.user_id = message.author.id
+        self.user_name = message.author.name
+        self.display_name = message.author.display_name
+        self.guild_id = message.guild.id if message.guild is not None else f'direct-{self.user_id}'
+        self.received_at = time.perf_counter()
+
+
+class CommandScheduler:
+    def __init__(self, workers: int = 4, user_rate: float = 0.5, user_burst: float = 3, guild_rate: float = 2,
+                 guild_burst: float = 10, guild_queue_size: int = 20):
+        """
+        Queue commands for each guild and run them with a fixed number of workers, one guild at a time in turn
+
+        :param workers: Number of commands run at once
+        :param user_rate: Commands each user can send per second once their burst is used up
+        :param user_burst: Commands each user can send at once
+        :param guild_rate: Commands each guild can send per second once its burst is used up
+        :param guild_burst: Commands each guild can send at once
+        :param guild_queue_size: Most commands waiting for each guild
+        """
+        # Public variables
+        self.workers = workers
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.guild_rate = guild_rate
+        self.guild_burst = guild_burst
+        self.guild_queue_size = guild_queue_size
+
+        # Private variables
+        self.__user_buckets = {}
+        self.__guild_buckets = {}
+        self.__queues = collections.OrderedDict()
+        self.__full_queues = set()
+        self.__ready = None
+        self.__worker_tasks = []
+
+    def submit(self, context: CommandContext, handler: callable) -> str:
+        """
+        Queue the command if the user and guild are under their limits
+
+        :param context: The command to run
+        :param handler: Coroutine function taking the context
+        :return: None if the command was queued, otherwise the reason it wasn't E.g. user, guild, queue
+        """
+        if not self.__worker_tasks:
+            self.__start()
+
+        user_bucket = self.__get_bucket(self.__user_buckets, context.user_id, self.user_rate, self.user_burst)
+        guild_bucket = self.__get_bucket(self.__guild_buckets, context.guild_id, self.guild_rate, self.guild_burst)
+        queue = self.__queues.get(context.guild_id)
+
+        # Only take the tokens once the command is sure to be queued, so a rejected one doesn't use up either limit
+        if queue is not None and len(queue) >= self.guild_queue_size:
+            return self.__reject_full_queue(context.guild_id)
+        if not user_bucket.has_token():
+            return self.__reject(user_bucket, 'user')
+        if not guild_bucket.has_token():
+            return self.__reject(guild_bucket, 'guild')
+        user_bucket.take()
+        guild_bucket.take()
+
+        if queue is None:
+            queue = self.__queues[context.guild_id] = collections.deque()
+        queue.append((context, handler))
+        self.__full_queues.discard(context.guild_id)
+        self.__ready.release()
+        return None
+
+    def get_queued(self) -> int:
+        """
+        Get the number of commands waiting to run
+        """
+        return sum(len(queue) for queue in self.__queues.values())
+
+    def __start(self):
+        """
+        Start the workers on the running event loop
+        """
+        self.__ready = asyncio.Semaphore(0)
+        self.__worker_tasks = [asyncio.ensure_future(self.__work()) for _ in range(self.workers)]
+
+    async def __work(self):
+        """
+        Run commands from each guild in turn
+        """
+        while True:
+            await self.__ready.acquire()
+
+            # Take from the guild at the front then send it to the back so every guild gets a turn
+            guild_id, queue = next(iter(self.__queues.items()))
+            context, handler = queue.popleft()
+            if queue:
+                self.__queues.move_to_end(guild_id)
+            else:
+                del self.__queues[guild_id]
+
+            metrics.registry.observe('command_queue_seconds', time.perf_counter() - context.received_at)
+            try:
+                with metrics.registry.timed('command_seconds', command=context.command):
+                    await handler(context)
+            except Exception as error:
+                metrics.registry.increment('errors_total', source=context.command)
+                print(f'Error running {context.command}: {error!r}', file=sys.stderr)
+
+    @staticmethod
+    def __get_bucket(buckets: dict, key: object, rate: float, capacity: float) -> TokenBucket:
+        """
+        Get the bucket for the user or guild, forgetting idle buckets when there are too many
+
+        :param buckets: Buckets of every user or every guild
+        :param key: Id of the user or guild
+        :param rate: Tokens added each second to a new bucket
+        :param capacity: Most tokens a new bucket can hold
+        """
+        if key not in buckets:
+            if len(buckets) >= MAX_IDLE_BUCKETS:
+                for idle_key in [old_key for old_key, bucket in buckets.items() if bucket.is_full()]:
+                    del buckets[idle_key]
+            buckets[key] = TokenBucket(rate, capacity)
+        return buckets[key]
+
+    @staticmethod
+    def __reject(bucket: TokenBucket, reason: str) -> str:
+        """
+        Count the rejected command, only giving the reason the first time so the user is told once
+
+        :param bucket: Bucket which was empty
+        :param reason: Why the command was rejected
+        """
+        metrics.registry.increment('rate_limited_total', reason=reason)
+        if bucket.limited:
+            return 'silent'
+        bucket.limited = True
+        return reason
+
+    def __reject_full_queue(self, guild_id: object) -> str:
+        """
+        Count the command rejected because its guild's queue is full, only giving the reason once until it has room
+
+        :param guild_id: Id of the guild
+        """
+        metrics.registry.increment('rate_limited_total', reason='queue')
+        if guild_id in self.__full_queues:
+            return 'silent'
+        self.__full_queues.add(guild_id)
+        return 'queue'
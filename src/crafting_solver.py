@@ -0,0 +1,112 @@
+"""
+Work out which parts of any item's recipe tree can be made along a path, solving parts shared between items once
+"""
+
+import item_store
+import recipe_compiler
+
+
+# noinspection PyMissingOrEmptyDocstring
+class ItemSolution:
+    __slots__ = ['craftable', 'gather', 'missing', 'parts']
+
+    def __init__(self, craftable: bool, gather: dict, missing: dict, parts: tuple):
+        """
+        How a single item can be made along a path
+
+        :param craftable: If the item can be picked up or crafted from what the path gives
+        :param gather: Count of each item to pick up, keyed by item id
+        :param missing: Count of each base ingredient which can't be found along the path, keyed by item id
+        :param parts: Ids of the largest crafted parts which can be made, only used when the item itself can't be
+        """
+        self.craftable = craftable
+        self.gather = gather
+        self.missing = missing
+        self.parts = parts
+
+
+class CraftingSolver:
+    def __init__(self, items: item_store.ItemStore, recipes: recipe_compiler.CompiledRecipes):
+        """
+        Solve the recipe tree of any item type, not only food and drinks
+
+        :param items: Store of every item
+        :param recipes: Compiled recipes for the same items
+        """
+        # Private variables
+        self.__items = items
+        self.__recipes = recipes
+        self.__lower_names = {name.lower(): item_id for item_id, name in enumerate(items.names)}
+
+    def get_item_id(self, name: str) -> int:
+        """
+        Find an item by its name, ignoring case
+
+        :param name: Name of the item
+        :return: Id of the item or None if no item has the name
+        """
+        return self.__lower_names.get(name.strip().lower())
+
+    def solve(self, targets: list, is_gatherable: callable) -> dict:
+        """
+        Solve every item in the targets' recipe trees, each only once no matter how many of the targets use it
+
+        :param targets: Ids of the items to make
+        :param is_gatherable: Function taking an item id, which is true if the item can be picked up along the path
+        :return: Dictionary of each solved item id to its ItemSolution
+        """
+        solutions = {}
+        for target in targets:
+
+            # Iterative depth first search so deep equipment trees don't hit the recursion limit
+            stack = [(target, False)]
+            while stack:
+                item_id, expanded = stack.pop()
+                if item_id in solutions:
+                    continue
+
+                # Anything which can be picked up isn't crafted, even if it has a recipe
+                gathered = is_gatherable(item_id)
+                materials = [] if gathered else self.__get_materials(item_id)
+                if expanded or not materials:
+                    solutions[item_id] = self.__solve_item(item_id, gathered, materials, solutions)
+                else:
+                    stack.append((item_id, True))
+                    stack.extend((material, False) for material in materials if material not in solutions)
+        return solutions
+
+    def __get_materials(self, item_id: int) -> list:
+        """
+        Get the materials the item is crafted from, or nothing if it can't be crafted
+
+        :param item_id: Id of the item
+        """
+        if not self.__recipes.is_crafted(item_id):
+            return []
+        return [self.__items.materials_1[item_id], self.__items.materials_2[item_id]]
+
+    @staticmethod
+    def __solve_item(item_id: int, gathered: bool, materials: list, solutions: dict) -> ItemSolution:
+        """
+        Solve the item from the solutions of its materials
+
+        :param item_id: Id of the item
+        :param gathered: If the item can be picked up along the path
+        :param materials: Ids of the materials to craft it from, empty if it can't be crafted
+        :param solutions: Solutions of every item solved so far, including the materials
+        """
+        if gathered:
+            return ItemSolution(True, {item_id: 1}, {}, ())
+        if not materials:
+            return ItemSolution(False, {}, {item_id: 1}, ())
+
+        gather = {}
+        missing = {}
+        for material in materials:
+            for leaf, count in solutions[material].gather.items():
+                gather[leaf] = gather.get(leaf, 0) + count
+            for leaf, count in solutions[material].missing.items():
+                missing[leaf] = missing.get(leaf, 0) + count
+        if not missing:
+            return ItemSolution(True, gather, missing, (item_id,))
+        return ItemSolution(False, gather, missing, solutions[materials[0]].parts + solutions[materials[1]].parts)
@@ -0,0 +1,127 @@
+"""
+Keep the files shared between processes safe to read at any time, and let only one process refresh them at once
+"""
+
+import contextlib
+import os
+import tempfile
+import time
+
+# Locking a file works differently on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Where the api results and other shared files are kept, the same place no matter which directory the bot runs from
+CACHE_DIRECTORY = os.path.abspath(os.getenv('ER_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                         '..', 'extra_files')))
+
+
+def get_cache_file(file_name: str) -> str:
+    """
+    Get the absolute path of a file in the cache directory
+
+    :param file_name: Name of the file E.g. api_results.json
+    """
+    return os.path.join(CACHE_DIRECTORY, file_name)
+
+
+@contextlib.contextmanager
+def atomic_write(file_name: str, mode: str = 'w'):
+    """
+    Write to a temporary file next to the file then swap it in, so readers see the old or new file but never half of one
+
+    :param file_name: Path of the file to write
+    :param mode: Mode to open the temporary file with E.g. wb
+    """
+    directory = os.path.dirname(os.path.abspath(file_name))
+    os.makedirs(directory, exist_ok=True)
+
+    # Every writer gets its own temporary file so processes writing at the same time don't mix their output
+    descriptor, temp_name = tempfile.mkstemp(prefix=f'.{os.path.basename(file_name)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(descriptor, mode) as output_file:
+            yield output_file
+            output_file.flush()
+            os.fsync(output_file.fileno())
+        os.chmod(temp_name, 0o644)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_name)
+        raise
+
+
+# noinspection PyMissingOrEmptyDocstring
+class FileLock:
+    def __init__(self, file_name: str, poll_interval: float = 0.1):
+        """
+        Lock held by a single process at a time, which the operating system releases if the process dies
+
+        :param file_name: Path of the lock file, created if it doesn't exist
+        :param poll_interval: Seconds between attempts while waiting for the lock
+        """
+        # Public variables
+        self.file_name = file_name
+        self.poll_interval = poll_interval
+
+        # Private variables
+        self.__file = None
+
+    def acquire(self, blocking: bool = True, timeout: float = None) -> bool:
+        """
+        Take the lock, waiting for the process holding it if told to
+
+        :param blocking: Wait until the lock is free instead of returning straight away
+        :param timeout: Most seconds to wait, forever if not given
+        :return: True if the lock was taken
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.try_acquire():
+            if not blocking or deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def try_acquire(self) -> bool:
+        """
+        Take the lock if no other process holds it, without waiting
+        """
+        if self.__file is not None:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.file_name)), exist_ok=True)
+        lock_file = open(self.file_name, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self.__file = lock_file
+        return True
+
+    def release(self):
+        """
+        Let another process take the lock, does nothing if it isn't held
+        """
+        if self.__file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.__file.seek(0)
+            msvcrt.locking(self.__file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.__file.close()
+        self.__file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
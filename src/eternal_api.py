@@ -2,17 +2,77 @@
 Handle all of the communications with the Eternal Return API
 """
 
-import requests
+import asyncio
+import aiohttp
+import http_client
 import json
 import os
 import datetime
+import disk_cache
+import hashlib
+import requests
+import single_flight
+import time
+import snapshot_format
+
+# Seconds before the saved api results are considered out of date
+CACHE_TTL = 10800
+
+# Where the api results are saved
+JSON_FILE = disk_cache.get_cache_file('api_results.json')
+SNAPSHOT_FILE = disk_cache.get_cache_file('api_results.snap')
+CHECKED_FILE = disk_cache.get_cache_file('api_results.checked')
+
+# Held by the process pulling from the API, so processes sharing the results on disk only pull them once
+LOCK_FILE = disk_cache.get_cache_file('api_results.lock')
+
+# Most seconds to wait for another process's pull before pulling anyway
+LOCK_TIMEOUT = 120
+
+# Every area which can be requested from the API
+AREA_LIST = ['Alley', 'Temple', 'Avenue', 'Pond', 'Hospital', 'Archery', 'School', 'Research Center',
+             'Cemetery', 'Factory', 'Hotel', 'Forest', 'Chapel', 'Beach', 'Uptown', 'Dock']
+
+# Every character whose stats are requested, these are optional so a character the API doesn't have is left out
+CHARACTER_LIST = ['Jackie', 'Aya', 'Fiora', 'Magnus', 'Zahir', 'Nadine', 'Hyunwoo', 'Hart', 'Isol', 'Li Dailin',
+                  'Yuki', 'Hyejin', 'Xiukai', 'Chiara', 'Sissela', 'Silvia', 'Adriana', 'Shoichi', 'Emma']
+
+# Number of endpoints requested in a full pull, all of which can be in flight at once by default
+ENDPOINT_COUNT = 1 + len(AREA_LIST) + len(CHARACTER_LIST)
+
+# Shared by every instance so threads which find the results out of date at the same time only pull them once
+_pulls = single_flight.SingleFlight()
+
+
+async def acquire_lock_async(lock: disk_cache.FileLock, timeout: float = None) -> bool:
+    """
+    Take the lock, waiting for the process holding it without blocking the event loop
+
+    :param lock: Lock to take
+    :param timeout: Most seconds to wait, forever if not given
+    :return: True if the lock was taken
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not lock.try_acquire():
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(lock.poll_interval)
+    return True
 
 
 # noinspection PyMissingOrEmptyDocstring
 class EternalReturnApi:
-    def __init__(self):
+    def __init__(self, force_pull: bool = False, concurrency: int = ENDPOINT_COUNT, request_timeout: float = 10,
+                 previous_info: dict = None, endpoint_versions: dict = None, checked_at: int = None):
         """
         Class to interact with the Eternal Return Api
+
+        :param force_pull: Always pull from the API instead of using the results on disk
+        :param concurrency: Maximum number of requests in flight at once when pulling asynchronously
+        :param request_timeout: Seconds to wait for each attempt of an asynchronous request before retrying
+        :param previous_info: Results of the last pull, reused for anything which hasn't changed since
+        :param endpoint_versions: Hash and cache headers of each endpoint from the last pull
+        :param checked_at: Time this process last found the previous results unchanged
         """
         # Public variables
         self.all_info_dict = {
@@ -20,56 +80,315 @@ class EternalReturnApi:
             'areas': {},
             'characters': {}
         }
+        self.concurrency = concurrency
+        self.request_timeout = request_timeout
+        self.last_pull_duration = None
+        self.endpoint_versions = dict(endpoint_versions or {})
+        self.changed_items = set()
+        self.changed_areas = set()
+        self.changed_characters = set()
 
         # Private variables
-        self.__base_url = 'http://api.playeternalreturn.com/aesop'
-        self.__all_items = f'{self.__base_url}/item/all'
-        self.__items_in_area = f'{self.__base_url}/area?areaName='
-        self.__areas_for_item = f'{self.__base_url}/area?itemName='
-        self.__character_stats = f'{self.__base_url}/char?name='
-        self.__force_pull = False
+        self.__client = http_client.client
+        self.__all_items = 'item/all'
+        self.__items_in_area = 'area?areaName='
+        self.__areas_for_item = 'area?itemName='
+        self.__character_stats = 'char?name='
+        self.__force_pull = force_pull
+        self.__previous_info = previous_info
+        self.__checked_at = checked_at
 
-    def get_all_info(self):
+    def get_all_info(self, allow_stale: bool = False):
         """
         Get the required information from the API or on disk
+
+        :param allow_stale: Use the results on disk even if they are older than the cache TTL
         """
-        if not self.__load_from_disk():
-            self.__get_all_item_info()
-            self.__get_all_area_info()
-            self.__save_to_disk()
+        if not self.__load_from_disk(allow_stale):
+            self.all_info_dict, self.last_pull_duration = _pulls.run(JSON_FILE, self.__pull)
 
         return self.all_info_dict
 
-    def __load_from_disk(self) -> bool:
+    def __pull(self) -> tuple:
+        """
+        Pull every endpoint and save the results to disk, unless another process is already pulling them
+
+        :return: The results and the seconds the pull took
+        """
+        start_time = time.perf_counter()
+        lock = disk_cache.FileLock(LOCK_FILE)
+        if not lock.acquire(blocking=False):
+
+            # Use the old results while the other process pulls, only waiting for it if there aren't any
+            if self.__load_from_disk(allow_stale=True):
+                return self.all_info_dict, time.perf_counter() - start_time
+            if not lock.acquire(timeout=LOCK_TIMEOUT):
+                return self.__load_after_lock_timeout(), time.perf_counter() - start_time
+
+        try:
+            if not self.__load_newer_from_disk():
+                self.__get_all_item_info()
+                self.__get_all_area_info()
+                self.__get_all_character_info()
+                self.__save_to_disk()
+        finally:
+            lock.release()
+        self.last_pull_duration = time.perf_counter() - start_time
+        return self.all_info_dict, self.last_pull_duration
+
+    async def get_all_info_async(self, allow_stale: bool = False):
+        """
+        Get the required information from the API or on disk, requesting the items and every area at the same time.
+        When the previous results are given, endpoints which haven't changed reuse them and the changes are saved
+        in changed_items, changed_areas and changed_characters.
+
+        :param allow_stale: Use the results on disk even if they are older than the cache TTL
+        """
+        if not self.__load_from_disk(allow_stale):
+            start_time = time.perf_counter()
+
+            # Only one process pulls at a time, the others keep serving what they have until it is saved
+            lock = disk_cache.FileLock(LOCK_FILE)
+            if not await acquire_lock_async(lock, LOCK_TIMEOUT):
+                self.__load_after_lock_timeout()
+                self.__find_changes()
+                self.last_pull_duration = time.perf_counter() - start_time
+                return self.all_info_dict
+            try:
+                if self.__load_newer_from_disk():
+                    self.__find_changes()
+                else:
+                    await self.__pull_async()
+            finally:
+                lock.release()
+            self.last_pull_duration = time.perf_counter() - start_time
+
+        return self.all_info_dict
+
+    async def __pull_async(self):
+        """
+        Request every endpoint at the same time and save the results to disk if they changed
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            responses = await asyncio.gather(
+                self.__fetch_async(session, semaphore, self.__all_items),
+                *[self.__fetch_async(session, semaphore, f'{self.__items_in_area}{area}') for area in AREA_LIST],
+                *[self.__fetch_optional_async(session, semaphore, f'{self.__character_stats}{character}')
+                  for character in CHARACTER_LIST])
+
+        # Endpoints without a response haven't changed since the previous pull
+        if responses[0] is None:
+            self.all_info_dict['items'] = dict(self.__previous_info['items'])
+        else:
+            self.__store_item_info(responses[0])
+        for area, response in zip(AREA_LIST, responses[1:len(AREA_LIST) + 1]):
+            if response is None:
+                self.all_info_dict['areas'][area] = dict(self.__previous_info['areas'][area])
+            else:
+                self.__store_area_info(area, response)
+        self.__add_items_not_in_containers()
+        for character, response in zip(CHARACTER_LIST, responses[len(AREA_LIST) + 1:]):
+            if response is None:
+                previous_characters = self.__previous_info.get('characters', {}) if self.__previous_info else {}
+                if character in previous_characters:
+                    self.all_info_dict['characters'][character] = previous_characters[character]
+            else:
+                self.__store_character_info(character, response)
+
+        self.__find_changes()
+        if self.__previous_info is None or self.changed_items or self.changed_areas or self.changed_characters:
+            self.__save_to_disk()
+        else:
+            self.__save_checked_time()
+
+    async def __fetch_async(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, path: str,
+                            optional: bool = False) -> str:
+        """
+        Request the given path once there is room under the concurrency limit, only if it changed since the last pull
+
+        :param session: Session shared by all of the requests in the pull
+        :param semaphore: Limits how many requests are in flight at once
+        :param path: Path of the endpoint to request
+        :param optional: Request it once without retries, keeping its failures away from the main circuit breaker
+        :return: The body of the response or None if it is the same as the last pull
+        """
+        # Only reuse the last pull if there is one to reuse
+        previous_version = self.endpoint_versions.get(path, {}) if self.__previous_info is not None else {}
+        headers = {}
+        if 'etag' in previous_version:
+            headers['If-None-Match'] = previous_version['etag']
+        if 'last_modified' in previous_version:
+            headers['If-Modified-Since'] = previous_version['last_modified']
+
+        async with semaphore:
+            status, response_headers, body = await self.__client.get_async(session, path, headers,
+                                                                           self.request_timeout, optional)
+        if status == 304:
+            return None
+
+        version = {'hash': hashlib.sha1(body.encode()).hexdigest()}
+        if 'ETag' in response_headers:
+            version['etag'] = response_headers['ETag']
+        if 'Last-Modified' in response_headers:
+            version['last_modified'] = response_headers['Last-Modified']
+        self.endpoint_versions[path] = version
+        if version['hash'] == previous_version.get('hash'):
+            return None
+        return body
+
+    async def __fetch_optional_async(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                                     path: str) -> str:
+        """
+        Request an optional endpoint, treating a failure the same as no change so it never stops the pull
+
+        :param session: Session shared by all of the requests in the pull
+        :param semaphore: Limits how many requests are in flight at once
+        :param path: Path of the endpoint to request
+        :return: The body of the response or None if it is the same as the last pull or couldn't be requested
+        """
+        try:
+            return await self.__fetch_async(session, semaphore, path, optional=True)
+        except (aiohttp.ClientError, asyncio.TimeoutError, http_client.ApiError):
+            return None
+
+    def __find_changes(self):
+        """
+        Compare the pull against the previous results, only looking at the fields the calculations use
+        """
+        if self.__previous_info is None:
+            self.changed_items = set(self.all_info_dict['items'])
+            self.changed_areas = set(self.all_info_dict['areas'])
+            self.changed_characters = set(self.all_info_dict['characters'])
+            return
+
+        new_items = self.all_info_dict['items']
+        old_items = self.__previous_info['items']
+        self.changed_items = {name for name in set(new_items) | set(old_items)
+                              if self.__get_used_fields(new_items.get(name)) != self.__get_used_fields(old_items.get(name))}
+
+        new_areas = self.all_info_dict['areas']
+        old_areas = self.__previous_info['areas']
+        self.changed_areas = {area for area in set(new_areas) | set(old_areas)
+                              if new_areas.get(area) != old_areas.get(area)}
+
+        new_characters = self.all_info_dict['characters']
+        old_characters = self.__previous_info.get('characters', {})
+        self.changed_characters = {character for character in set(new_characters) | set(old_characters)
+                                   if new_characters.get(character) != old_characters.get(character)}
+
+    @staticmethod
+    def __get_used_fields(item: dict) -> dict:
+        """
+        Get only the fields of the item which the calculations use
+
+        :param item: Dictionary of the item or None if it doesn't exist
+        """
+        if item is None:
+            return None
+        return {field: item.get(field) for field in snapshot_format.ITEM_FIELDS}
+
+    def __load_from_disk(self, allow_stale: bool = False) -> bool:
         """
         Load the dictionary from disk if the last pull was recent
 
+        :param allow_stale: Load the file regardless of when it was last pulled
         :return True on successful load from disk.
         """
         # Can't load if the file doesn't exist
-        if not os.path.isfile('../extra_files/api_results.json') or self.__force_pull:
+        if self.__force_pull:
+            return False
+        my_dict = self.__read_from_disk()
+        if my_dict is None:
             return False
 
+        # Don't load if the last pull was old
+        if not allow_stale and my_dict['__timestamp'] + CACHE_TTL < int(datetime.datetime.now().timestamp()):
+            return False
+
+        # Use the on disk results
         else:
-            with open('../extra_files/api_results.json', 'r') as input_file:
-                my_dict = json.load(input_file)
+            self.all_info_dict = my_dict
+            return True
 
-                # Don't load if the last pull was old
-                if my_dict['__timestamp'] + 10800 < int(datetime.datetime.now().timestamp()):
-                    return False
+    def __load_newer_from_disk(self) -> bool:
+        """
+        Load the results on disk if another process saved or checked recent ones while this one waited to pull, which
+        are newer than the previous results and the last check of them when they are given
 
-                # Use the on disk json file
-                else:
-                    self.all_info_dict = my_dict
-                    return True
+        :return: True if the results on disk were loaded
+        """
+        my_dict = self.__read_from_disk()
+        if my_dict is None or my_dict['__timestamp'] + CACHE_TTL < int(datetime.datetime.now().timestamp()):
+            return False
+        if self.__previous_info is None and self.__force_pull:
+            return False
+
+        # The checked time this process saved itself doesn't make the results on disk any newer than what it has
+        if self.__previous_info is not None and \
+                my_dict['__timestamp'] <= max(self.__previous_info['__timestamp'], self.__checked_at or 0):
+            return False
+        self.all_info_dict = my_dict
+        return True
+
+    def __load_after_lock_timeout(self) -> dict:
+        """
+        Use the results on disk however old they are when another process has held the lock for too long, since
+        pulling without the lock could have both processes writing the same files
+
+        :return: The results on disk
+        """
+        my_dict = self.__read_from_disk()
+        if my_dict is None:
+            raise TimeoutError(f'Another process has been pulling the api results for over {LOCK_TIMEOUT} seconds')
+        self.all_info_dict = my_dict
+        return my_dict
+
+    @staticmethod
+    def __read_from_disk() -> dict:
+        """
+        Read the saved results, every file is replaced in one step so it is never read halfway through a write
+
+        :return: The results or None if there aren't any which can be read
+        """
+        if not os.path.isfile(JSON_FILE) and not os.path.isfile(SNAPSHOT_FILE):
+            return None
+
+        # Prefer the binary snapshot unless the json file was written after it
+        my_dict = None
+        if os.path.isfile(SNAPSHOT_FILE) and \
+                (not os.path.isfile(JSON_FILE) or os.path.getmtime(SNAPSHOT_FILE) >= os.path.getmtime(JSON_FILE)):
+
+            # A snapshot saved in an older format is skipped, falling back to the json file if there is one
+            try:
+                my_dict = snapshot_format.read_snapshot(SNAPSHOT_FILE)
+            except ValueError:
+                if not os.path.isfile(JSON_FILE):
+                    return None
+        if my_dict is None:
+            with open(JSON_FILE, 'r') as input_file:
+                my_dict = json.load(input_file)
+
+        # A pull which found no changes only updates the checked time
+        if os.path.isfile(CHECKED_FILE):
+            with open(CHECKED_FILE, 'r') as input_file:
+                my_dict['__timestamp'] = max(my_dict['__timestamp'], int(input_file.read().strip() or 0))
+        return my_dict
 
     def __get_all_item_info(self):
         """
         Get all of the information for each of the items
         """
-        api_response = requests.get(self.__all_items)
-        # self.all_info_dict['items'] = json.loads(api_response.content.decode().strip())
-        all_items_list = json.loads(api_response.content.decode().strip())
+        self.__store_item_info(self.__client.get(self.__all_items))
+
+    def __store_item_info(self, response: str):
+        """
+        Save the items from the item/all response
+
+        :param response: Body of the response
+        """
+        all_items_list = json.loads(response)
         for item in all_items_list:
             self.all_info_dict['items'][item['Name']] = item
 
@@ -77,29 +396,65 @@ class EternalReturnApi:
         """
         Get information for each of the areas
         """
-        area_list = ['Alley', 'Temple', 'Avenue', 'Pond', 'Hospital', 'Archery', 'School', 'Research Center',
-                     'Cemetery', 'Factory', 'Hotel', 'Forest', 'Chapel', 'Beach', 'Uptown', 'Dock']
-
         # Get a list of items for each area
-        for area in area_list:
-            self.all_info_dict['areas'][area] = {}
-            api_response = requests.get(f'{self.__items_in_area}{area}')
+        for area in AREA_LIST:
+            self.__store_area_info(area, self.__client.get(f'{self.__items_in_area}{area}'))
+
+        self.__add_items_not_in_containers()
+
+    def __store_area_info(self, area: str, response: str):
+        """
+        Save the items found in the area from its area response
+
+        :param area: Name of the area
+        :param response: Body of the response
+        """
+        self.all_info_dict['areas'][area] = {}
+
+        # Ignore the error if no results are found from the Research Center, that is expected
+        try:
+            items_in_area = json.loads(response)
+        except json.JSONDecodeError:
+            if area == 'Research Center':
+                pass
+            else:
+                raise
+            return
 
-            # Ignore the error if no results are found from the Research Center, that is expected
+        # Save the list to the class variable
+        for item in items_in_area:
+            self.all_info_dict['areas'][area][item['ItemName']] = item['DropCount']
+
+    def __get_all_character_info(self):
+        """
+        Get the stats of each character, skipping any which can't be requested
+        """
+        for character in CHARACTER_LIST:
             try:
-                items_in_area = json.loads(api_response.content.decode().strip())
-            except json.JSONDecodeError:
-                if area == 'Research Center':
-                    pass
-                else:
-                    raise json.JSONDecodeError
+                response = self.__client.get(f'{self.__character_stats}{character}', optional=True)
+                self.__store_character_info(character, response)
+            except (requests.RequestException, http_client.ApiError):
                 continue
 
-            # Save the list to the class variable
-            for item in items_in_area:
-                self.all_info_dict['areas'][area][item['ItemName']] = item['DropCount']
+    def __store_character_info(self, character: str, response: str):
+        """
+        Save the stats of the character from its character response
 
-        self.__add_items_not_in_containers()
+        :param character: Name of the character
+        :param response: Body of the response
+        """
+        # The character data is optional, so a response which isn't json is ignored
+        try:
+            character_stats = json.loads(response)
+        except json.JSONDecodeError:
+            return
+
+        # Some responses are a list holding the single character
+        if isinstance(character_stats, list):
+            if not character_stats:
+                return
+            character_stats = character_stats[0]
+        self.all_info_dict['characters'][character] = character_stats
 
     def __add_items_not_in_containers(self):
         """
@@ -128,8 +483,18 @@ class EternalReturnApi:
         """
         # noinspection PyTypeChecker
         self.all_info_dict['__timestamp'] = int(datetime.datetime.now().timestamp())
-        with open('../extra_files/api_results.json', 'w') as output_file:
+        with disk_cache.atomic_write(JSON_FILE) as output_file:
             json.dump(self.all_info_dict, output_file)
+        snapshot_format.save_snapshot(self.all_info_dict, SNAPSHOT_FILE)
+
+    def __save_checked_time(self):
+        """
+        Save when the api was last checked without rewriting the unchanged results
+        """
+        # noinspection PyTypeChecker
+        self.all_info_dict['__timestamp'] = int(datetime.datetime.now().timestamp())
+        with disk_cache.atomic_write(CHECKED_FILE) as output_file:
+            output_file.write(str(self.all_info_dict['__timestamp']))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,281 @@
+"""
+Keep one shared copy of the game data in memory for the whole process and refresh it in the background
+"""
+
+import answer_table
+import asyncio
+import concurrent.futures
+import crafting_solver
+import datetime
+import sys
+import threading
+import types
+import eternal_api
+import ingredient_index
+import item_store
+import metrics
+import ranking
+import single_flight
+import recipe_compiler
+import yield_model
+
+
+class GameDataSnapshot:
+    def __init__(self, all_info: dict, version: int, unchanged_items_from: 'GameDataSnapshot' = None):
+        """
+        Read only view of the items and areas from a single pull of the API
+
+        :param all_info: Dictionary in the same format as EternalReturnApi.all_info_dict
+        :param version: Number which increases every time a new snapshot is published
+        :param unchanged_items_from: Earlier snapshot with the same items, whose item structures are reused
+        """
+        self.items = types.MappingProxyType(all_info['items'])
+        self.areas = types.MappingProxyType(all_info['areas'])
+        self.characters = types.MappingProxyType(all_info.get('characters', {}))
+        self.timestamp = all_info.get('__timestamp', int(datetime.datetime.now().timestamp()))
+        self.version = version
+
+        # Structures derived from the items, built once for the snapshot
+        if unchanged_items_from is None:
+            self.item_store = item_store.ItemStore(self.items)
+            self.recipes = recipe_compiler.CompiledRecipes(self.item_store)
+            self.ranking = ranking.RankingEngine(self.item_store, self.recipes)
+            self.crafting_solver = crafting_solver.CraftingSolver(self.item_store, self.recipes)
+        else:
+            self.item_store = unchanged_items_from.item_store
+            self.recipes = unchanged_items_from.recipes
+            self.ranking = unchanged_items_from.ranking
+            self.crafting_solver = unchanged_items_from.crafting_solver
+        self.ingredient_index = ingredient_index.IngredientIndex(self.item_store, self.areas, self.recipes)
+        self.yield_model = yield_model.YieldModel(self.item_store, self.recipes, self.ingredient_index, self.areas)
+
+        # Filled in by the store when the best items are precomputed for every set of areas
+        self.answer_table = None
+
+        # Same layout as the api results so it can be used in place of them
+        self.all_info = types.MappingProxyType({
+            'items': self.items,
+            'areas': self.areas,
+            'characters': self.characters,
+            '__timestamp': self.timestamp
+        })
+
+    def expires_at(self) -> int:
+        """
+        Get the time the snapshot should be replaced by a newer pull
+        """
+        return self.timestamp + eternal_api.CACHE_TTL
+
+
+class GameDataStore:
+    def __init__(self, refresh_margin: int = 900, retry_delay: int = 60,
+                 concurrency: int = eternal_api.ENDPOINT_COUNT, request_timeout: float = 10,
+                 precompute_answers: bool = False):
+        """
+        Hold the current snapshot and swap in a new one before the old one expires
+
+        :param refresh_margin: Seconds before the snapshot expires to start refreshing
+        :param retry_delay: Seconds to wait between refreshes, so a failed or unchanged one is not retried straight away
+        :param concurrency: Maximum number of API requests in flight during a refresh
+        :param request_timeout: Seconds to wait for each API request during a refresh
+        :param precompute_answers: Build the answer table for every snapshot before it is swapped in
+        """
+        # Public variables
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self.concurrency = concurrency
+        self.request_timeout = request_timeout
+        self.precompute_answers = precompute_answers
+        self.last_refresh_duration = None
+
+        # Private variables
+        self.__snapshot = None
+        self.__version = 0
+        self.__endpoint_versions = {}
+        self.__checked_at = None
+        self.__lock = threading.Lock()
+        self.__stop_event = threading.Event()
+        self.__refresh_thread = None
+        self.__listeners = []
+        self.__refreshes = single_flight.SingleFlight()
+
+    def get_snapshot(self) -> GameDataSnapshot:
+        """
+        Get the current snapshot, only loading it if nothing has been loaded yet. The first load can't happen inside
+        a running event loop.
+        """
+        snapshot = self.__snapshot
+        if snapshot is None:
+            with self.__lock:
+                if self.__snapshot is None:
+                    self.__publish(self.__build(self.__load_first()))
+                snapshot = self.__snapshot
+        return snapshot
+
+    def __load_first(self) -> dict:
+        """
+        Load the results on disk, or pull them with every endpoint requested at the same time if there aren't any
+        """
+        # Waiting for the pull would stop the event loop, so it has to be loaded before the loop starts
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError('The game data has to be loaded with start() or load() before the event loop runs')
+
+        # The pull gets its own loop in its own thread, leaving the event loop of this thread as it was
+        api = eternal_api.EternalReturnApi(concurrency=self.concurrency, request_timeout=self.request_timeout)
+        with concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='game-data-load') as executor:
+            return executor.submit(lambda: asyncio.run(api.get_all_info_async(allow_stale=True))).result()
+
+    def load(self, all_info: dict, answers: answer_table.AnswerTable = None) -> GameDataSnapshot:
+        """
+        Publish the given results in place of the current snapshot, used by tools and shard workers with their own data
+
+        :param all_info: Dictionary in the same format as EternalReturnApi.all_info_dict
+        :param answers: Answer table already built for the results
+        """
+        snapshot = self.__build(all_info, answers=answers)
+        with self.__lock:
+            self.__publish(snapshot)
+        return snapshot
+
+    def get_age(self) -> float:
+        """
+        Get the seconds since the current snapshot was pulled or None if nothing is loaded yet
+        """
+        snapshot = self.__snapshot
+        if snapshot is None:
+            return None
+        return datetime.datetime.now().timestamp() - snapshot.timestamp
+
+    def add_listener(self, listener: callable):
+        """
+        Call the given function with the new snapshot every time one is published
+
+        :param listener: Function taking the new snapshot
+        """
+        self.__listeners.append(listener)
+
+    def refresh(self) -> GameDataSnapshot:
+        """
+        Pull new information from the API and publish it if anything changed, joining a refresh already in progress
+        """
+        return self.__refreshes.run('refresh', self.__refresh)
+
+    def __refresh(self) -> GameDataSnapshot:
+        """
+        Pull new information from the API and publish it if anything changed
+        """
+        current = self.get_snapshot()
+        api = eternal_api.EternalReturnApi(force_pull=True, concurrency=self.concurrency,
+                                           request_timeout=self.request_timeout, previous_info=current.all_info,
+                                           endpoint_versions=self.__endpoint_versions, checked_at=self.__checked_at)
+        all_info = asyncio.run(api.get_all_info_async())
+        self.last_refresh_duration = api.last_pull_duration
+        metrics.registry.observe('game_data_refresh_seconds', api.last_pull_duration)
+        self.__endpoint_versions = api.endpoint_versions
+        self.__checked_at = all_info['__timestamp']
+
+        # Keep the current version so everything cached for it stays valid
+        if not api.changed_items and not api.changed_areas and not api.changed_characters:
+            return current
+
+        # Only the characters changed, so the answers for the items and areas still hold
+        unchanged_answers = current.answer_table if not api.changed_items and not api.changed_areas else None
+        snapshot = self.__build(all_info, None if api.changed_items else current, unchanged_answers)
+        with self.__lock:
+            self.__publish(snapshot)
+        return snapshot
+
+    def start(self):
+        """
+        Load the snapshot, precompute its answers and start refreshing it in the background
+        """
+        self.precompute_answers = True
+        snapshot = self.get_snapshot()
+        if snapshot.answer_table is None:
+            snapshot.answer_table = answer_table.build_answer_table(snapshot)
+        if self.__refresh_thread is None:
+            self.__stop_event.clear()
+            self.__refresh_thread = threading.Thread(target=self.__refresh_loop, name='game-data-refresh',
+                                                     daemon=True)
+            self.__refresh_thread.start()
+
+    def stop(self):
+        """
+        Stop the background refresh
+        """
+        self.__stop_event.set()
+        if self.__refresh_thread is not None:
+            self.__refresh_thread.join()
+            self.__refresh_thread = None
+
+    def __refresh_loop(self):
+        """
+        Wait until the snapshot is about to expire then refresh it
+        """
+        minimum_wait = 0
+        while True:
+            expires_at = self.__snapshot.expires_at()
+            if self.__checked_at is not None:
+                expires_at = max(expires_at, self.__checked_at + eternal_api.CACHE_TTL)
+            wait_time = expires_at - self.refresh_margin - datetime.datetime.now().timestamp()
+            if self.__stop_event.wait(max(wait_time, minimum_wait)):
+                return
+
+            # Never refresh again straight away, even if the results found are already inside the refresh margin
+            minimum_wait = self.retry_delay
+
+            # Keep serving the old snapshot if the API can't be reached
+            try:
+                self.refresh()
+            except Exception as error:
+                metrics.registry.increment('errors_total', source='refresh')
+                print(f'Unable to refresh game data: {error}', file=sys.stderr)
+
+    def __build(self, all_info: dict, unchanged_items_from: GameDataSnapshot = None,
+                answers: answer_table.AnswerTable = None) -> GameDataSnapshot:
+        """
+        Create the next snapshot and everything derived from it
+
+        :param all_info: Dictionary in the same format as EternalReturnApi.all_info_dict
+        :param unchanged_items_from: Earlier snapshot with the same items, whose item structures are reused
+        :param answers: Answer table already built for the results
+        """
+        self.__version += 1
+        snapshot = GameDataSnapshot(all_info, self.__version, unchanged_items_from)
+        snapshot.answer_table = answers
+        if answers is None and self.precompute_answers:
+            snapshot.answer_table = answer_table.build_answer_table(snapshot)
+        return snapshot
+
+    def __publish(self, snapshot: GameDataSnapshot):
+        """
+        Swap in a new snapshot. Must be called while holding the lock.
+
+        :param snapshot: The snapshot to swap in
+        """
+        self.__snapshot = snapshot
+        for listener in self.__listeners:
+            listener(self.__snapshot)
+
+
+# Shared by everything in the process
+store = GameDataStore()
+metrics.registry.add_gauge('game_data_age_seconds', store.get_age)
+
+
+def get_snapshot() -> GameDataSnapshot:
+    """
+    Get the current snapshot of the game data
+    """
+    return store.get_snapshot()
+
+
+def start_background_refresh():
+    """
+    Load the game data and keep it up to date in the background
+    """
+    store.start()
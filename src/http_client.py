@@ -0,0 +1,223 @@
+"""
+Pooled HTTP client for the Eternal Return API with timeouts, retries and a circuit breaker
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import aiohttp
+import metrics
+import requests
+import requests.adapters
+
+# Response codes which are worth trying again
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class ApiError(Exception):
+    """
+    The API gave an error response after every retry
+    """
+
+
+class StatusError(ApiError):
+    """
+    The API gave an error response which trying again won't fix E.g. 404
+    """
+
+
+class CircuitOpenError(ApiError):
+    """
+    The API failed too many times in a row, so requests aren't being sent until it has had time to recover
+    """
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        """
+        Stop sending requests after repeated failures, trying again once the timeout has passed
+
+        :param failure_threshold: Number of failures in a row before the circuit opens
+        :param reset_timeout: Seconds to wait before trying a request again
+        """
+        # Public variables
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+        # Private variables
+        self.__lock = threading.Lock()
+
+    def before_request(self):
+        """
+        Raise an error instead of sending the request while the circuit is open
+        """
+        with self.__lock:
+            if self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f'Not sending requests for {self.reset_timeout} seconds after '
+                                       f'{self.failures} failures')
+
+    def record_success(self):
+        """
+        Close the circuit after a request succeeds
+        """
+        with self.__lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """
+        Count the failure, opening the circuit once there are too many in a row
+        """
+        with self.__lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def get_state(self) -> str:
+        """
+        Get if the circuit is closed, open or waiting for a request to test it
+        """
+        with self.__lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return 'open'
+            return 'half-open'
+
+
+class ApiClient:
+    def __init__(self, base_url: str, timeout: float = 10, retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 8, pool_size: int = 16):
+        """
+        Send requests to the API, keeping connections open between them
+
+        :param base_url: Url every path is added to
+        :param timeout: Seconds to wait for each request
+        :param retries: Number of times to retry a failed request
+        :param backoff_base: Seconds to wait before the first retry, doubling for each one after
+        :param backoff_max: Most seconds to wait before a retry
+        :param pool_size: Number of connections to keep open
+        """
+        # Public variables
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker()
+        self.optional_breaker = CircuitBreaker()
+
+        # Private variables
+        self.__session = requests.Session()
+        self.__session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                                      pool_maxsize=pool_size))
+        self.__session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                                       pool_maxsize=pool_size))
+
+    def get(self, path: str, optional: bool = False) -> str:
+        """
+        Request the path, retrying with backoff if it fails
+
+        :param path: Path after the base url E.g. item/all
+        :param optional: Only try once and count a failure on the optional breaker, so it can't block the rest
+        :return: The body of the response
+        """
+        retries, breaker = self.__get_policy(optional)
+        breaker.before_request()
+        for attempt in range(retries + 1):
+            start_time = time.perf_counter()
+            try:
+                api_response = self.__session.get(f'{self.base_url}/{path}', timeout=self.timeout)
+                if api_response.status_code in RETRY_STATUSES:
+                    raise ApiError(f'{path} responded with {api_response.status_code}')
+                if not 200 <= api_response.status_code < 300:
+                    raise StatusError(f'{path} responded with {api_response.status_code}')
+                self.__record(path, time.perf_counter() - start_time)
+                breaker.record_success()
+                return api_response.content.decode().strip()
+            except (requests.RequestException, ApiError) as error:
+                self.__record(path, time.perf_counter() - start_time, error)
+                if attempt == retries or isinstance(error, StatusError):
+                    breaker.record_failure()
+                    raise
+                time.sleep(self.get_backoff(attempt))
+
+    async def get_async(self, session: aiohttp.ClientSession, path: str, headers: dict = None,
+                        timeout: float = None, optional: bool = False) -> tuple:
+        """
+        Request the path with the session, retrying with backoff if it fails
+
+        :param session: Session shared by all of the requests in a pull
+        :param path: Path after the base url E.g. item/all
+        :param headers: Extra headers to send
+        :param timeout: Seconds to wait for each attempt, defaults to the client's timeout
+        :param optional: Only try once and count a failure on the optional breaker, so it can't block the rest
+        :return: The status, headers and body of the response
+        """
+        retries, breaker = self.__get_policy(optional)
+        breaker.before_request()
+        for attempt in range(retries + 1):
+            start_time = time.perf_counter()
+            try:
+                async with session.get(f'{self.base_url}/{path}', headers=headers or {},
+                                       timeout=aiohttp.ClientTimeout(total=timeout or self.timeout)) as api_response:
+                    if api_response.status in RETRY_STATUSES:
+                        raise ApiError(f'{path} responded with {api_response.status}')
+
+                    # Not modified is the answer to a conditional request, not an error
+                    if not 200 <= api_response.status < 300 and api_response.status != 304:
+                        raise StatusError(f'{path} responded with {api_response.status}')
+                    body = (await api_response.read()).decode().strip()
+                    self.__record(path, time.perf_counter() - start_time)
+                    breaker.record_success()
+                    return api_response.status, api_response.headers.copy(), body
+            except (aiohttp.ClientError, asyncio.TimeoutError, ApiError) as error:
+                self.__record(path, time.perf_counter() - start_time, error)
+                if attempt == retries or isinstance(error, StatusError):
+                    breaker.record_failure()
+                    raise
+                await asyncio.sleep(self.get_backoff(attempt))
+
+    def get_backoff(self, attempt: int) -> float:
+        """
+        Get a random wait up to the exponential backoff so retries from many requests don't line up
+
+        :param attempt: Number of attempts which have already failed, starting at 0
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def __get_policy(self, optional: bool) -> tuple:
+        """
+        Get the number of retries and the circuit breaker for a request
+
+        :param optional: If the request is for an optional endpoint
+        """
+        if optional:
+            return 0, self.optional_breaker
+        return self.retries, self.breaker
+
+    @staticmethod
+    def __record(path: str, latency: float, error: Exception = None):
+        """
+        Add the request to the metrics of its endpoint, shown by !er_stats and served to Prometheus
+
+        :param path: Path which was requested
+        :param latency: Seconds the request took
+        :param error: The error if the request failed
+        """
+        endpoint = path.split('?')[0]
+        metrics.registry.observe('api_request_seconds', latency, endpoint=endpoint)
+        if error is not None:
+            metrics.registry.increment('api_errors_total', endpoint=endpoint, error=type(error).__name__)
+
+
+# Shared by every pull so connections and the circuit breaker carry over between them
+client = ApiClient(os.getenv('ER_API_BASE_URL', 'http://api.playeternalreturn.com/aesop'),
+                   timeout=float(os.getenv('ER_API_TIMEOUT', 10)),
+                   retries=int(os.getenv('ER_API_RETRIES', 3)))
+metrics.registry.add_gauge('api_circuit_open', lambda: int(client.breaker.get_state() == 'open'))
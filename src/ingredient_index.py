@@ -0,0 +1,147 @@
+"""
+Bitmask index of which ingredients each area spawns and which ingredients each item needs
+"""
+
+import item_store
+import recipe_compiler
+
+# Ingredients which can be gathered no matter which path is taken
+ALWAYS_AVAILABLE = ['Stone', 'Branch', 'Bread', 'Water']
+
+# Areas which can be chosen in a path, in the order of their numbers
+NUMBERED_AREAS = ['Alley', 'Archery', 'Avenue', 'Beach', 'Cemetery', 'Chapel', 'Dock', 'Factory', 'Forest', 'Hospital',
+                  'Hotel', 'Pond', 'School', 'Temple', 'Uptown']
+
+# Ingredients which are given at the start as well as found on the map
+START_INGREDIENTS = ['Bread', 'Water']
+
+# Item types which can be eaten or drunk
+CONSUMABLE_TYPES = ['Food', 'Beverage']
+
+
+class IngredientIndex:
+    def __init__(self, items: item_store.ItemStore, areas: dict, recipes: recipe_compiler.CompiledRecipes):
+        """
+        Give every ingredient a bit and store each area and recipe as an integer mask
+
+        :param items: Store of every item
+        :param areas: Dictionary of the items spawning in each area keyed by the area name
+        :param recipes: Compiled recipes for the same items
+        """
+        # Public variables
+        self.bits = {}
+        self.ingredients = []
+        self.consumables = [item_id for item_id in range(len(items))
+                            if items.get_type(item_id) in CONSUMABLE_TYPES and recipes.is_compiled(item_id)]
+        self.area_masks = {}
+        self.required_masks = {}
+        self.always_available_mask = 0
+        self.spawn_masks = [0] * len(items)
+        self.start_ingredients = {items.ids[name] for name in START_INGREDIENTS if name in items.ids}
+        self.always_available = {items.ids[name] for name in ALWAYS_AVAILABLE if name in items.ids}
+
+        # Private variables
+        self.__items = items
+        self.__recipes = recipes
+
+        self.__build(areas)
+
+    def get_available_mask(self, path: list) -> int:
+        """
+        Get every ingredient which can be gathered along the path
+
+        :param path: List of area names
+        """
+        available = self.always_available_mask
+        for area in path:
+            available |= self.area_masks.get(area, 0)
+        return available
+
+    def get_subset_available_mask(self, area_subset: int) -> int:
+        """
+        Get every ingredient which can be gathered from a set of numbered areas
+
+        :param area_subset: Mask with the bit of each area number visited set
+        """
+        return self.get_available_mask([area for cnt, area in enumerate(NUMBERED_AREAS) if area_subset >> cnt & 1])
+
+    def is_available(self, item_id: int, available: int) -> bool:
+        """
+        Check if the item itself can be picked up
+
+        :param item_id: Id of the item
+        :param available: Mask of the ingredients which can be gathered
+        """
+        return available >> self.bits[item_id] & 1 == 1
+
+    def is_feasible(self, item_id: int, available: int) -> bool:
+        """
+        Check if the item can be picked up or crafted from the available ingredients
+
+        :param item_id: Id of the item
+        :param available: Mask of the ingredients which can be gathered
+        """
+        if self.is_available(item_id, available):
+            return True
+        return self.__recipes.is_crafted(item_id) and self.required_masks[item_id] & ~available == 0
+
+    def is_gatherable(self, item_id: int, area_subset: int) -> bool:
+        """
+        Check if any item, not only an ingredient of a consumable, can be picked up from a set of numbered areas
+
+        :param item_id: Id of the item
+        :param area_subset: Mask with the bit of each area number visited set
+        """
+        return self.spawn_masks[item_id] & area_subset != 0 or item_id in self.always_available
+
+    def get_feasible_consumables(self, available: int) -> list:
+        """
+        Get every food and drink which can be made from the available ingredients
+
+        :param available: Mask of the ingredients which can be gathered
+        """
+        return [item_id for item_id in self.consumables if self.is_feasible(item_id, available)]
+
+    def __build(self, areas: dict):
+        """
+        Create the masks for every area and consumable
+
+        :param areas: Dictionary of the items spawning in each area keyed by the area name
+        """
+        always_available = [self.__items.ids[name] for name in ALWAYS_AVAILABLE if name in self.__items.ids]
+        for item_id in self.consumables + always_available:
+            self.__get_bit(item_id)
+        for item_id in self.consumables:
+            required = 0
+            for leaf in self.__recipes.leaf_counts[item_id]:
+                required |= 1 << self.__get_bit(leaf)
+            self.required_masks[item_id] = required
+
+        # Only consumables spawning in an area count as gathered from it
+        consumables = set(self.consumables)
+        for area, area_items in areas.items():
+            self.area_masks[area] = 0
+            for name in area_items:
+                item_id = self.__items.ids.get(name)
+                if item_id in consumables:
+                    self.area_masks[area] |= 1 << self.bits[item_id]
+
+        for item_id in always_available:
+            self.always_available_mask |= 1 << self.bits[item_id]
+
+        # Numbered areas each item spawns in, with the bit of each area number set
+        for number, area in enumerate(NUMBERED_AREAS):
+            for name in areas.get(area, {}):
+                if name in self.__items.ids:
+                    self.spawn_masks[self.__items.ids[name]] |= 1 << number
+
+    def __get_bit(self, item_id: int) -> int:
+        """
+        Get the bit for the ingredient, giving it the next one if it doesn't have one yet
+
+        :param item_id: Id of the ingredient
+        """
+        if item_id not in self.bits:
+            self.bits[item_id] = len(self.ingredients)
+            self.ingredients.append(item_id)
+        return self.bits[item_id]
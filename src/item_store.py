@@ -0,0 +1,78 @@
+"""
+Compact columns of the item fields the calculations use, with every item given a dense integer id
+"""
+
+import array
+
+# Stored in place of an empty stat
+NO_VALUE = -1
+
+# Stored in place of an empty material, or one which isn't in the item list
+NO_ITEM = -1
+UNKNOWN_ITEM = -2
+
+# Stats which are stored for every item
+STATS = ['Heal', 'SpRestore']
+
+
+# noinspection PyMissingOrEmptyDocstring
+class ItemStore:
+    __slots__ = ['names', 'ids', 'type_names', 'item_types', 'stats', 'initial_counts', 'materials_1', 'materials_2']
+
+    def __init__(self, items: dict):
+        """
+        Give each item the id of its position in the item list and store its fields in typed arrays
+
+        :param items: Dictionary of every item keyed by the item name
+        """
+        # Public variables
+        self.names = list(items)
+        self.ids = {name: item_id for item_id, name in enumerate(self.names)}
+        self.type_names = []
+        self.item_types = array.array('H')
+        self.stats = {stat: array.array('i') for stat in STATS}
+        self.initial_counts = array.array('i')
+        self.materials_1 = array.array('i')
+        self.materials_2 = array.array('i')
+
+        type_ids = {}
+        for item_info in items.values():
+            if item_info['ItemType'] not in type_ids:
+                type_ids[item_info['ItemType']] = len(self.type_names)
+                self.type_names.append(item_info['ItemType'])
+            self.item_types.append(type_ids[item_info['ItemType']])
+            for stat in STATS:
+                self.stats[stat].append(NO_VALUE if item_info[stat] == '' else item_info[stat])
+            self.initial_counts.append(item_info['InitialCount'])
+            self.materials_1.append(self.__get_material_id(item_info['Material1']))
+            self.materials_2.append(self.__get_material_id(item_info['Material2']))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get_type(self, item_id: int) -> str:
+        """
+        Get the item type E.g. Food
+
+        :param item_id: Id of the item
+        """
+        return self.type_names[self.item_types[item_id]]
+
+    def has_stat(self, item_id: int, stat: str) -> bool:
+        """
+        Check if the item has a value for the stat
+
+        :param item_id: Id of the item
+        :param stat: The stat to check E.g. Heal
+        """
+        return self.stats[stat][item_id] != NO_VALUE
+
+    def __get_material_id(self, name: str) -> int:
+        """
+        Get the id of a material, marking empty and unknown materials
+
+        :param name: Name of the material
+        """
+        if name == '':
+            return NO_ITEM
+        return self.ids.get(name, UNKNOWN_ITEM)
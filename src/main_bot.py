@@ -2,32 +2,50 @@
 The main brains of the game. This handles all of the interactions with discord.
 """
 
+import asyncio
+import build_calculator
+import command_scheduler
+import concurrent.futures
 import os
 import urllib
 import time
 import sys
+import metrics
 import path_calculator
-import eternal_api
+import ranking
+import reply_builder
+import single_flight
+import route_optimizer
+import game_data
 
-from discord import ActivityType, Activity
+from discord import ActivityType, Activity, Embed
 from discord.ext import commands
 from dotenv import load_dotenv
 
 
+class BotBusyError(Exception):
+    """
+    Every thread in the command pool is still running a calculation, E.g. ones which timed out
+    """
+
+
 class DiscordBot:
     """
     Discord Game Bot
     """
 
-    def __init__(self):
+    def __init__(self, shard_ids: list = None, shard_count: int = None):
+        """
+        Connect to discord and start handling commands
+
+        :param shard_ids: Gateway shards this process handles when running as one of several processes
+        :param shard_count: Total number of gateway shards across every process
+        """
         # Bot variables
-        self.bot = commands.Bot(command_prefix='!')
-        self.channel = None
-        self.user_name = None
-        self.user_id = None
-        self.user_object = None
-        self.display_name = None
-        self.message = None
+        if shard_count is None:
+            self.bot = commands.Bot(command_prefix='!')
+        else:
+            self.bot = commands.AutoShardedBot(command_prefix='!', shard_ids=shard_ids, shard_count=shard_count)
         self.reaction_payload = None
         self.message_type = None
 
@@ -35,37 +53,196 @@ class DiscordBot:
         self.main_embed = None
         self.inventory_embed = None
 
+        # Commands are rate limited and each guild takes its turn, ER_SCHEDULER_WORKERS sets how many run at once
+        self.scheduler = command_scheduler.CommandScheduler(
+            workers=int(os.getenv('ER_SCHEDULER_WORKERS', 4)),
+            user_rate=float(os.getenv('ER_USER_RATE', 0.5)),
+            user_burst=float(os.getenv('ER_USER_BURST', 3)),
+            guild_rate=float(os.getenv('ER_GUILD_RATE', 2)),
+            guild_burst=float(os.getenv('ER_GUILD_BURST', 10)),
+            guild_queue_size=int(os.getenv('ER_GUILD_QUEUE_SIZE', 20)))
+        metrics.registry.add_gauge('queued_commands', self.scheduler.get_queued)
+
+        # Calculations run in a pool so they never block the connection to discord, with a thread for each scheduler
+        # worker. Calculations which timed out keep their thread until they finish, so the bot only says it is busy
+        # when those leave no thread for a new one.
+        self.command_pool = concurrent.futures.ThreadPoolExecutor(self.scheduler.workers)
+        self.command_timeout = float(os.getenv('ER_COMMAND_TIMEOUT', 10))
+        self.max_pending_commands = self.scheduler.workers
+        self.pending_commands = 0
+
+        # Users asking for the same thing at the same time share one calculation
+        self.in_flight = single_flight.AsyncSingleFlight()
+        metrics.registry.add_gauge('coalesced_commands', lambda: self.in_flight.shared)
+
+        # Send replies as embeds instead of plain text
+        self.use_embeds = os.getenv('ER_REPLY_EMBEDS', '').lower() in ['1', 'true', 'yes']
+
+        # Users allowed to see the bot's stats, along with server administrators
+        self.admin_ids = [int(user_id) for user_id in os.getenv('ER_ADMIN_IDS', '').split(',') if user_id.strip()]
+
         # Start listening to chat
         self.start_bot()
 
-    async def get_food_beverages(self, path_list: list):
+    async def get_food_beverages(self, context: command_scheduler.CommandContext):
         """
         Get the food and beverages based on the give route
 
-        :param path_list: List of the areas traveling through
+        :param context: The command, with the areas traveling through and optionally a list type as its arguments
         """
-        path_string = ' '.join(path_list)
+        # The list type can be given after the areas E.g. !er 2 14 pareto
+        arguments = list(context.arguments)
+        list_type = 'balanced'
+        if arguments and arguments[-1].lower() in ranking.LIST_TYPES:
+            list_type = arguments.pop().lower()
+
+        path_string = ' '.join(arguments)
         if len(path_string) > 0:
-            path_calc = path_calculator.PathCalc(path_string, 'balanced').create_item_path()
-            for message_type_main in path_calc:
-                for message_main in path_calc[message_type_main]:
-                    if message_type_main == 'error':
-                        await self.message.channel.send(f'ERROR - {message_main}')
-                    else:
-                        await self.message.channel.send(message_main)
+            channel = context.channel
+            path_calc = await self.run_in_pool(channel, lambda: path_calculator.PathCalc(path_string, list_type)
+                                               .create_item_path(), ('er', path_string, list_type))
+            if path_calc is None:
+                return
+            await self.send_reply(channel, path_calc)
         else:
-            await self.help_message()
+            await self.help_message(context)
 
-    async def display_area_list(self, *args, **kwargs):
+    async def get_best_route(self, context: command_scheduler.CommandContext):
+        """
+        Find the best route to take based on the given options
+
+        :param context: The command, with the number of areas to visit followed by any required, forbidden areas and
+                        stat weighting as its arguments
+        """
+        if len(context.arguments) > 0:
+            channel = context.channel
+            route_string = ' '.join(context.arguments)
+            route_calc = await self.run_in_pool(channel, lambda: route_optimizer.RouteCalc(route_string)
+                                                .create_route(), ('er_route', route_string.lower()))
+            if route_calc is None:
+                return
+            await self.send_reply(channel, route_calc)
+        else:
+            await self.help_message(context)
+
+    async def get_build(self, context: command_scheduler.CommandContext):
+        """
+        Check which parts of a build can be crafted along the given route
+
+        :param context: The command, with the areas traveling through followed by the items in the build as its
+                        arguments
+        """
+        if len(context.arguments) > 0:
+            channel = context.channel
+            build_string = ' '.join(context.arguments)
+            build_calc = await self.run_in_pool(channel, lambda: build_calculator.BuildCalc(build_string)
+                                                .create_build(), ('er_build', build_string.lower()))
+            if build_calc is None:
+                return
+            await self.send_reply(channel, build_calc)
+        else:
+            await self.help_message(context)
+
+    async def run_in_pool(self, channel: object, calculation: callable, key: tuple = None):
+        """
+        Run the calculation in the command pool, telling the user if the bot is too busy or it takes too long
+
+        :param channel: Channel to send any problems to
+        :param calculation: Function to run
+        :param key: Identifies calculations with the same result so ones already in flight are shared
+        :return: The result of the calculation or None if it wasn't completed
+        """
+        try:
+            if key is None:
+                return await self.calculate(calculation)
+            return await self.in_flight.run(key, lambda: self.calculate(calculation))
+        except BotBusyError:
+            metrics.registry.increment('errors_total', source='busy')
+            await self.send_message(channel, 'The bot is busy right now, please try again in a moment')
+            return None
+        except asyncio.TimeoutError:
+            metrics.registry.increment('errors_total', source='timeout')
+            await self.send_message(channel, 'ERROR - The calculation took too long, please try again')
+            return None
+
+    async def calculate(self, calculation: callable):
+        """
+        Run the calculation in the command pool, turning away new work instead of queueing it behind stuck ones
+
+        :param calculation: Function to run
+        :return: The result of the calculation
+        """
+        if self.pending_commands >= self.max_pending_commands:
+            raise BotBusyError()
+
+        # The slot is only given back once the calculation stops, which can be long after the user was told it timed out
+        self.pending_commands += 1
+        loop = asyncio.get_running_loop()
+        future = self.command_pool.submit(calculation)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.release_command))
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.command_timeout)
+
+    def release_command(self):
+        """
+        Give back the slot of a calculation which has stopped running
+        """
+        self.pending_commands -= 1
+
+    async def send_reply(self, channel: object, messages: dict):
+        """
+        Send the errors and info from a calculation in as few messages as possible
+
+        :param channel: Channel to send the reply to
+        :param messages: Dictionary with the info and error messages
+        """
+        builder = reply_builder.ReplyBuilder()
+        builder.add_messages(messages)
+        if self.use_embeds:
+            for fields in builder.get_embeds():
+                embed = Embed()
+                for name, value in fields:
+                    embed.add_field(name=name, value=value, inline=False)
+                await self.send_message(channel, embed=embed)
+        else:
+            for message in builder.get_messages():
+                await self.send_message(channel, message)
+
+    @staticmethod
+    async def send_message(channel: object, message: str = None, embed: object = None):
+        """
+        Send the message, timing how long discord takes to accept it
+
+        :param channel: Channel to send the message to
+        :param message: Text to send
+        :param embed: Embed to send
+        """
+        metrics.registry.increment('discord_sends_total')
+        with metrics.registry.timed('discord_send_seconds'):
+            await channel.send(message, embed=embed)
+
+    async def display_area_list(self, context: command_scheduler.CommandContext):
         """
         Display the list of each area and the designated number
+
+        :param context: The command
         """
-        areas_dict = eternal_api.EternalReturnApi().get_all_info()['areas']
-        areas_dict.pop('Research Center')
+        areas = [area for area in game_data.get_snapshot().areas if area != 'Research Center']
         final_string = ''
-        for cnt, area in enumerate(sorted(list(areas_dict.keys()))):
+        for cnt, area in enumerate(sorted(areas)):
             final_string += f'{cnt:<3}- {area}\n'
-        await self.message.channel.send(final_string)
+        await self.send_message(context.channel, final_string)
+
+    async def display_stats(self, context: command_scheduler.CommandContext):
+        """
+        Display the latency and error metrics to admins
+
+        :param context: The command
+        """
+        permissions = getattr(context.user_object, 'guild_permissions', None)
+        if context.user_id not in self.admin_ids and not (permissions is not None and permissions.administrator):
+            await self.unknown_command(context)
+            return
+        await self.send_message(context.channel, f'```\n{metrics.registry.get_summary()[:1980]}\n```')
 
     # @staticmethod
     # async def add_reactions(message: object, reactions: list):
@@ -94,19 +271,35 @@ class DiscordBot:
     #     for reaction in reactions:
     #         await message.add_reaction(reactions_dict[reaction])
 
-    async def help_message(self, *args, **kwargs):
+    async def help_message(self, context: command_scheduler.CommandContext):
         """
         Display the help message for the bot
+
+        :param context: The command
         """
-        await self.message.channel.send('Use `!er_list` to display each area\'s number.\n'
+        await self.send_message(context.channel, 'Use `!er_list` to display each area\'s number.\n'
                                         'Then use `!er [area #1] [area #2]...` to calculate the best options for your given path.\n'
-                                        'E.g. `!er 2 14 15`')
+                                        'E.g. `!er 2 14 15`\n'
+                                        'Add `total`, `single`, `pareto` or `expected` after the areas for a '
+                                        'different list than the balanced one, `pareto` showing every item which '
+                                        'isn\'t beaten on all of its stats and `expected` how much the path is '
+                                        'likely to give.\n'
+                                        'E.g. `!er 2 14 pareto`\n'
+                                        'Use `!er_route [# of areas]` to find the best path, adding `+[area #]` to '
+                                        'require an area, `-[area #]` to avoid one and `heal`, `sp` or `both` to '
+                                        'choose what to favour.\n'
+                                        'E.g. `!er_route 5 +2 -14 heal`\n'
+                                        'Use `!er_build [area #1] [area #2]... [item], [item]...` to check which '
+                                        'parts of a build can be crafted along your path.\n'
+                                        'E.g. `!er_build 2 14 15 Chain Legs, Mithril Armor`')
 
-    async def unknown_command(self):
+    async def unknown_command(self, context: command_scheduler.CommandContext):
         """
         Tell the user the given command is unknown
+
+        :param context: The command
         """
-        await self.message.channel.send(f'Unknown command')
+        await self.send_message(context.channel, f'Unknown command')
 
     def start_bot(self):
         """
@@ -114,8 +307,11 @@ class DiscordBot:
         """
         valid_commands = {
             'er': self.get_food_beverages,
+            'er_route': self.get_best_route,
+            'er_build': self.get_build,
             'er_list': self.display_area_list,
-            'er_help': self.help_message
+            'er_help': self.help_message,
+            'er_stats': self.display_stats
         }
 
         # noinspection PyArgumentList
@@ -130,13 +326,12 @@ class DiscordBot:
                     and message.content.split()[0][1:] in valid_commands \
                     and message.content[0] == '!'\
                     and not message.author.bot:
-                self.user_name = message.author.name
-                self.user_object = message.author
-                self.display_name = message.author.display_name
-                self.user_id = message.author.id
-                self.message = message
-                self.channel = message.channel
-                await valid_commands[message.content.split()[0][1:]](message.content.split()[1:])
+                command = message.content.split()[0][1:]
+                metrics.registry.increment('commands_total', command=command)
+                context = command_scheduler.CommandContext(message, command, message.content.split()[1:])
+                rejected = self.scheduler.submit(context, valid_commands[command])
+                if rejected in ['user', 'guild', 'queue']:
+                    await self.send_message(context.channel, 'Too many commands right now, please slow down')
 
         # @self.bot.event
         # async def on_raw_reaction_add(reaction_payload: object):
@@ -195,6 +390,13 @@ if __name__ == '__main__':
     # Load environment variables
     load_dotenv()
 
+    # Keep the game data in memory and refresh it before it expires
+    game_data.start_background_refresh()
+
+    # Serve the metrics to Prometheus if a port is given
+    if os.getenv('ER_METRICS_PORT'):
+        metrics.start_server(int(os.getenv('ER_METRICS_PORT')), os.getenv('ER_METRICS_HOST', '127.0.0.1'))
+
     while True:
 
         # Wait until retrying if the service is down
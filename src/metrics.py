@@ -0,0 +1,224 @@
+"""
+Low overhead latency histograms and counters for the bot, shown by !er_stats and optionally served to Prometheus
+"""
+
+import bisect
+import contextlib
+import http.server
+import threading
+import time
+
+# Upper bounds in seconds of each histogram bucket, from 100 microseconds up to 30 seconds
+BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+class Histogram:
+    def __init__(self):
+        """
+        Count of observations in each bucket along with their total
+        """
+        # Public variables
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def observe(self, value: float):
+        """
+        Add a value to its bucket. Must be called while holding the registry lock.
+
+        :param value: Seconds the operation took
+        """
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def get_percentile(self, percent: float) -> float:
+        """
+        Estimate a percentile as the upper bound of the bucket it falls in
+
+        :param percent: Percentile to get E.g. 99
+        """
+        target = percent / 100 * self.count
+        seen = 0
+        for cnt, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target and bucket_count:
+                return BUCKETS[cnt] if cnt < len(BUCKETS) else self.maximum
+        return 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Every histogram, counter and gauge kept by the process
+        """
+        # Private variables
+        self.__histograms = {}
+        self.__counters = {}
+        self.__gauges = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Add a value to a histogram
+
+        :param name: Name of the histogram E.g. command_seconds
+        :param value: Seconds the operation took
+        :param labels: Labels telling apart the series in the histogram E.g. command='er'
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            if key not in self.__histograms:
+                self.__histograms[key] = Histogram()
+            self.__histograms[key].observe(value)
+
+    def increment(self, name: str, amount: int = 1, **labels):
+        """
+        Add to a counter
+
+        :param name: Name of the counter E.g. command_errors_total
+        :param amount: Amount to add
+        :param labels: Labels telling apart the series in the counter
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + amount
+
+    def add_gauge(self, name: str, function: callable):
+        """
+        Read a value from the function every time the metrics are collected
+
+        :param name: Name of the gauge E.g. game_data_age_seconds
+        :param function: Function returning the current value or None if there isn't one
+        """
+        with self.__lock:
+            self.__gauges[name] = function
+
+    @contextlib.contextmanager
+    def timed(self, name: str, **labels):
+        """
+        Time the body of the with statement and add it to a histogram
+
+        :param name: Name of the histogram
+        :param labels: Labels telling apart the series in the histogram
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def get_summary(self) -> str:
+        """
+        Get a short table of every metric for the stats command
+        """
+        histograms, counters, gauges = self.__collect()
+        lines = [f'{"Latency":<48}{"count":>7}{"mean ms":>9}{"p50 ms":>8}{"p99 ms":>8}']
+        for (name, labels), histogram in sorted(histograms.items()):
+            series = f'{name}{{{",".join(value for _, value in labels)}}}' if labels else name
+            lines.append(f'{series:<48}{histogram.count:>7}{histogram.total / histogram.count * 1000:>9.1f}'
+                         f'{histogram.get_percentile(50) * 1000:>8.1f}{histogram.get_percentile(99) * 1000:>8.1f}')
+        for (name, labels), value in sorted(counters.items()):
+            series = f'{name}{{{",".join(value for _, value in labels)}}}' if labels else name
+            lines.append(f'{series:<48}{value:>7}')
+        for name, value in sorted(gauges.items()):
+            lines.append(f'{name:<48}{value:>7.0f}')
+        return '\n'.join(lines)
+
+    def get_prometheus_text(self) -> str:
+        """
+        Get every metric in the Prometheus text format
+        """
+        histograms, counters, gauges = self.__collect()
+        lines = []
+        written_types = set()
+
+        def add_type(name: str, metric_type: str):
+            if name not in written_types:
+                written_types.add(name)
+                lines.append(f'# TYPE er_{name} {metric_type}')
+
+        for (name, labels), histogram in sorted(histograms.items()):
+            add_type(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ['+Inf'], histogram.buckets):
+                cumulative += bucket_count
+                lines.append(f'er_{name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'er_{name}_sum{format_labels(labels)} {histogram.total}')
+            lines.append(f'er_{name}_count{format_labels(labels)} {histogram.count}')
+        for (name, labels), value in sorted(counters.items()):
+            add_type(name, 'counter')
+            lines.append(f'er_{name}{format_labels(labels)} {value}')
+        for name, value in sorted(gauges.items()):
+            add_type(name, 'gauge')
+            lines.append(f'er_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def __collect(self) -> tuple:
+        """
+        Copy every metric so they can be formatted without holding the lock
+        """
+        with self.__lock:
+            histograms = {}
+            for key, histogram in self.__histograms.items():
+                histograms[key] = Histogram()
+                histograms[key].buckets = list(histogram.buckets)
+                histograms[key].count = histogram.count
+                histograms[key].total = histogram.total
+                histograms[key].maximum = histogram.maximum
+            counters = dict(self.__counters)
+            gauge_functions = dict(self.__gauges)
+
+        # Gauges can take locks of their own so they are read after letting go of this one
+        gauges = {}
+        for name, function in gauge_functions.items():
+            value = function()
+            if value is not None:
+                gauges[name] = value
+        return histograms, counters, gauges
+
+
+def format_labels(labels: tuple) -> str:
+    """
+    Get the labels of a series in the Prometheus text format E.g. {command="er"}
+
+    :param labels: Tuple of each label name and value
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+# noinspection PyMissingOrEmptyDocstring
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.get_prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(port: int, host: str = '127.0.0.1') -> http.server.ThreadingHTTPServer:
+    """
+    Serve the metrics at /metrics from a background thread
+
+    :param port: Port to listen on
+    :param host: Address to listen on, only the local machine by default
+    """
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+# Shared by everything in the process
+registry = MetricsRegistry()
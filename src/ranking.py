@@ -0,0 +1,130 @@
+"""
+Rank the possible items for every list type in a single pass, or find the ones which can't be beaten
+"""
+
+import heapq
+import operator
+import item_store
+import recipe_compiler
+
+# Every type of list which can be requested
+LIST_TYPES = ['total', 'single', 'balanced', 'pareto', 'expected']
+
+# Lists which always hold the same number of items, ranked together by rank
+TOP_LIST_TYPES = ['total', 'single', 'balanced']
+
+
+class RankingEngine:
+    def __init__(self, items: item_store.ItemStore, recipes: recipe_compiler.CompiledRecipes):
+        """
+        Rank items by their single value, total value or a balance of both
+
+        :param items: Store of every item
+        :param recipes: Compiled recipes for the same items
+        """
+        # Private variables
+        self.__items = items
+        self.__recipes = recipes
+        self.__pareto_vectors = {stat: [self.__get_pareto_vector(item_id, stat) for item_id in range(len(items))]
+                                 for stat in item_store.STATS}
+
+    def rank(self, candidates: list, stat: str, result_count: int) -> dict:
+        """
+        Get the best candidates for every list type. Ties keep the order the candidates were given in.
+
+        :param candidates: Ids of the items to rank
+        :param stat: The stat to compare
+        :param result_count: The number of items to return for each list type
+        :return: Dictionary of each list type to the ids of the best items in order
+        """
+        values = self.__items.stats[stat]
+        quantity = self.__recipes.quantity
+        single_scores = {item_id: values[item_id] for item_id in candidates}
+        total_scores = {item_id: values[item_id] * quantity[item_id] for item_id in candidates}
+
+        # The balanced list compares twice as many items from the other two lists
+        best_single = heapq.nlargest(result_count * 2, candidates, key=single_scores.get)
+        best_total = heapq.nlargest(result_count * 2, candidates, key=total_scores.get)
+        return {
+            'single': best_single[:result_count],
+            'total': best_total[:result_count],
+            'balanced': self.__get_balanced(best_single, best_total, single_scores, total_scores, result_count)
+        }
+
+    def get_pareto(self, candidates: list, stat: str) -> list:
+        """
+        Get the candidates no other candidate beats on every one of Heal, SpRestore, quantity and crafting cost
+
+        Uses sort filter skyline. Once sorted best first on each value in turn, a candidate can only be beaten by one
+        before it, so each only needs comparing against the items already kept.
+
+        :param candidates: Ids of the items to compare
+        :param stat: The stat to order the items by
+        :return: Ids of the items which aren't beaten, in order of the stat
+        """
+        vectors = self.__pareto_vectors[stat]
+        frontier = []
+        frontier_vectors = []
+        for item_id in sorted(candidates, key=vectors.__getitem__, reverse=True):
+            vector = vectors[item_id]
+
+            # Beaten if a kept item is at least as good on every value and isn't an exact tie
+            for kept_vector in frontier_vectors:
+                if kept_vector != vector and all(map(operator.ge, kept_vector, vector)):
+                    break
+            else:
+                frontier.append(item_id)
+                frontier_vectors.append(vector)
+        return frontier
+
+    def __get_pareto_vector(self, item_id: int, stat: str) -> tuple:
+        """
+        Get the values an item is compared on, where higher is always better and a missing stat counts as 0
+
+        :param item_id: Id of the item
+        :param stat: The stat which is compared first
+        """
+        stats = [stat] + [other_stat for other_stat in item_store.STATS if other_stat != stat]
+        leaf_count = sum(self.__recipes.leaf_counts[item_id].values()) if self.__recipes.is_compiled(item_id) else 0
+        return tuple(max(0, self.__items.stats[current_stat][item_id]) for current_stat in stats) + (
+            self.__recipes.quantity[item_id],
+            -leaf_count,
+            -self.__recipes.depth[item_id]
+        )
+
+    def __get_balanced(self, best_single: list, best_total: list, single_scores: dict, total_scores: dict,
+                       result_count: int) -> list:
+        """
+        Get the crafted items with the lowest combined position in the single and total lists
+
+        :param best_single: Ids of the best single items in order
+        :param best_total: Ids of the best total items in order
+        :param single_scores: Single value of each candidate
+        :param total_scores: Total value of each candidate
+        :param result_count: The number of items to return
+        """
+        single_positions = self.__get_positions(best_single, single_scores)
+        total_positions = self.__get_positions(best_total, total_scores)
+
+        # Remove any which aren't crafted E.g. Water
+        final_score = {item_id: position + total_positions[item_id] for item_id, position in single_positions.items()
+                       if item_id in total_positions and self.__recipes.is_crafted(item_id)}
+        return sorted(final_score, key=final_score.get)[:result_count]
+
+    @staticmethod
+    def __get_positions(ranked: list, scores: dict) -> dict:
+        """
+        Get the position of each item in the ranked list, with equal scores sharing the higher position
+
+        :param ranked: Ids of the items in order
+        :param scores: Value of each item
+        """
+        positions = {}
+        previous_score = None
+        for cnt, item_id in enumerate(ranked):
+            if previous_score is None or scores[item_id] < previous_score:
+                previous_score = scores[item_id]
+                positions[item_id] = cnt
+            else:
+                positions[item_id] = positions[ranked[cnt - 1]]
+        return positions
@@ -0,0 +1,120 @@
+"""
+Compile the recipes of every item once so the calculations become table lookups
+"""
+
+import item_store
+
+# Ingredients which always count as two when crafting, no matter how many are crafted from them
+DOUBLE_COUNT_INGREDIENTS = ['Branch', 'Bread']
+
+
+class CompiledRecipes:
+    def __init__(self, items: item_store.ItemStore):
+        """
+        Order every item so its materials come before it and save what each item needs, indexed by item id
+
+        :param items: Store of every item
+        """
+        # Public variables
+        self.order = []
+        self.quantity = [0] * len(items)
+        self.leaves = [None] * len(items)
+        self.leaf_counts = [None] * len(items)
+        self.depth = [-1] * len(items)
+
+        # Private variables
+        self.__items = items
+        self.__double_count = {items.ids[name] for name in DOUBLE_COUNT_INGREDIENTS if name in items.ids}
+
+        self.__compile()
+
+    def is_compiled(self, item_id: int) -> bool:
+        """
+        Check if the item can be gathered or crafted, which isn't the case if its recipe uses an unknown item
+
+        :param item_id: Id of the item
+        """
+        return self.depth[item_id] >= 0
+
+    def is_crafted(self, item_id: int) -> bool:
+        """
+        Check if the item is crafted from other items
+
+        :param item_id: Id of the item
+        """
+        return self.depth[item_id] > 0
+
+    def __compile(self):
+        """
+        Walk the recipe graph once, filling in the tables for each item after its materials
+        """
+        state = {}
+        for item_id in range(len(self.__items)):
+            if item_id in state:
+                continue
+
+            # Iterative depth first search so deep recipe trees don't hit the recursion limit
+            stack = [(item_id, False)]
+            while stack:
+                current, expanded = stack.pop()
+                if expanded:
+                    state[current] = 'done'
+                    self.__add_item(current)
+                    continue
+                if state.get(current) == 'done':
+                    continue
+                if state.get(current) == 'visiting':
+                    raise ValueError(f'Recipe for {self.__items.names[current]} contains itself')
+
+                state[current] = 'visiting'
+                stack.append((current, True))
+                for material in self.__get_materials(current):
+                    if state.get(material) != 'done':
+                        stack.append((material, False))
+
+    def __get_materials(self, item_id: int) -> list:
+        """
+        Get the materials used to craft the item which exist in the item list
+
+        :param item_id: Id of the item
+        """
+        if self.__items.materials_1[item_id] == item_store.NO_ITEM:
+            return []
+        return [material for material in [self.__items.materials_1[item_id], self.__items.materials_2[item_id]]
+                if material >= 0]
+
+    def __add_item(self, item_id: int):
+        """
+        Fill in the tables for the item. All of its materials must already be added.
+
+        :param item_id: Id of the item
+        """
+        material_1 = self.__items.materials_1[item_id]
+        material_2 = self.__items.materials_2[item_id]
+
+        # Items made from something unknown can never be crafted, so leave them out
+        if material_1 != item_store.NO_ITEM and \
+                (material_1 < 0 or material_2 < 0 or not self.is_compiled(material_1) or
+                 not self.is_compiled(material_2)):
+            return
+
+        self.order.append(item_id)
+        if material_1 == item_store.NO_ITEM:
+            self.quantity[item_id] = self.__items.initial_counts[item_id]
+            self.leaves[item_id] = (item_id,)
+            self.depth[item_id] = 0
+        else:
+            count_1 = self.quantity[material_1]
+            count_2 = self.quantity[material_2]
+            if material_1 in self.__double_count:
+                count_1 = 2
+            elif material_2 in self.__double_count:
+                count_2 = 2
+            self.quantity[item_id] = min(count_1, count_2) * self.__items.initial_counts[item_id]
+            self.leaves[item_id] = self.leaves[material_1] + self.leaves[material_2]
+            self.depth[item_id] = max(self.depth[material_1], self.depth[material_2]) + 1
+
+        leaf_counts = {}
+        for leaf in self.leaves[item_id]:
+            leaf_counts[leaf] = leaf_counts.get(leaf, 0) + 1
+        self.leaf_counts[item_id] = leaf_counts
@@ -0,0 +1,123 @@
+"""
+Pack the bot's replies into as few discord messages as possible without going over discord's size limits
+"""
+
+# Most characters discord allows in a message
+MESSAGE_LIMIT = 2000
+
+# Most characters discord allows in an embed field's name and value, across every field in an embed,
+# and the most fields in an embed
+FIELD_NAME_LIMIT = 256
+FIELD_VALUE_LIMIT = 1024
+EMBED_TOTAL_LIMIT = 6000
+FIELDS_PER_EMBED = 25
+
+# Discord needs every field to have a name, so fields without a header use a zero width space
+BLANK_FIELD_NAME = '\u200b'
+
+# Separates the items in a block so long blocks can be split between them
+ITEM_SEPARATOR = '\n\n'
+
+
+class ReplyBuilder:
+    def __init__(self, message_limit: int = MESSAGE_LIMIT):
+        """
+        Collect the errors and blocks of a reply then pack them into messages
+
+        :param message_limit: Most characters in each message
+        """
+        # Public variables
+        self.message_limit = message_limit
+
+        # Private variables
+        self.__errors = []
+        self.__blocks = []
+
+    def add_messages(self, messages: dict):
+        """
+        Add the messages returned by a calculation E.g. PathCalc.create_item_path
+
+        :param messages: Dictionary with the info and error messages
+        """
+        self.__errors += [f'ERROR - {error}' for error in messages.get('error', [])]
+        self.__blocks += messages.get('info', [])
+
+    def get_messages(self) -> list:
+        """
+        Get the reply as text messages, splitting blocks between items when they don't fit in one message
+        """
+        pieces = []
+        if self.__errors:
+            pieces += split_text('\n'.join(self.__errors), self.message_limit, '\n')
+        for block in self.__blocks:
+            pieces += split_text(block.strip(), self.message_limit, ITEM_SEPARATOR)
+
+        messages = []
+        for piece in pieces:
+            if messages and len(messages[-1]) + len(ITEM_SEPARATOR) + len(piece) <= self.message_limit:
+                messages[-1] += ITEM_SEPARATOR + piece
+            else:
+                messages.append(piece)
+        return messages
+
+    def get_embeds(self) -> list:
+        """
+        Get the reply as embeds, with a field for the errors and each block
+
+        :return: List of embeds, each a list of the name and value of its fields
+        """
+        fields = []
+        if self.__errors:
+            for value in split_text('\n'.join(self.__errors), FIELD_VALUE_LIMIT, '\n'):
+                fields.append(('Errors', value))
+        for block in self.__blocks:
+            name, value = get_header(block.strip())
+            # Discord doesn't allow empty fields, which happens when nothing can be made
+            for piece in split_text(value or 'None', FIELD_VALUE_LIMIT, ITEM_SEPARATOR):
+                fields.append((name, piece))
+
+        embeds = []
+        for name, value in fields:
+            if embeds and len(embeds[-1]) < FIELDS_PER_EMBED and \
+                    sum(len(old_name) + len(old_value) for old_name, old_value in embeds[-1]) + len(name) + \
+                    len(value) <= EMBED_TOTAL_LIMIT:
+                embeds[-1].append((name, value))
+            else:
+                embeds.append([(name, value)])
+        return embeds
+
+
+def get_header(block: str) -> tuple:
+    """
+    Split a block into its header and the rest when its first line is only a bold header E.g. **Best Foods To Create:**
+
+    :param block: Text of the block
+    :return: The header and the rest, or a blank name and the whole block if it doesn't start with a header
+    """
+    first_line, _, rest = block.partition('\n')
+    header = first_line.strip()
+    if len(header) > 4 and header.startswith('**') and header.endswith('**') and '**' not in header[2:-2]:
+        return header[2:-2][:FIELD_NAME_LIMIT], rest
+    return BLANK_FIELD_NAME, block
+
+
+def split_text(text: str, limit: int, separator: str) -> list:
+    """
+    Split the text into pieces no longer than the limit, only breaking at the separator unless a part is too long
+
+    :param text: Text to split
+    :param limit: Most characters in each piece
+    :param separator: Where the text should be split E.g. between items
+    """
+    pieces = []
+    for part in text.split(separator):
+        if pieces and len(pieces[-1]) + len(separator) + len(part) <= limit:
+            pieces[-1] += separator + part
+            continue
+
+        # A single part longer than the limit has to be cut wherever it reaches it
+        while len(part) > limit:
+            pieces.append(part[:limit])
+            part = part[limit:]
+        pieces.append(part)
+    return pieces
@@ -0,0 +1,107 @@
+"""
+Remember the messages for recently requested paths so popular routes aren't calculated again
+"""
+
+import collections
+import os
+import sys
+import threading
+import game_data
+import metrics
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 4 * 1024 * 1024):
+        """
+        Least recently used cache limited by both the number of entries and their size
+
+        :param max_entries: The most entries to keep
+        :param max_bytes: The most bytes the cached messages can take up
+        """
+        # Public variables
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Private variables
+        self.__entries = collections.OrderedDict()
+        self.__sizes = {}
+        self.__total_bytes = 0
+        self.__lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """
+        Get the cached messages, marking them as recently used
+
+        :param key: Area tuple, list type, result count and snapshot version
+        :return: A copy of the messages or None if they aren't cached
+        """
+        with self.__lock:
+            if key not in self.__entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return list(self.__entries[key])
+
+    def put(self, key: tuple, messages: list):
+        """
+        Cache the messages, removing the least recently used entries to stay under the limits
+
+        :param key: Area tuple, list type, result count and snapshot version
+        :param messages: The messages to cache
+        """
+        size = sys.getsizeof(messages) + sum(sys.getsizeof(message) for message in messages)
+        if size > self.max_bytes:
+            return
+
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = list(messages)
+            self.__sizes[key] = size
+            self.__total_bytes += size
+            while len(self.__entries) > self.max_entries or self.__total_bytes > self.max_bytes:
+                self.__remove(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove every entry, used when a new snapshot is published
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__sizes.clear()
+            self.__total_bytes = 0
+
+    def get_stats(self) -> dict:
+        """
+        Get the counters used to size the cache
+        """
+        with self.__lock:
+            return {
+                'entries': len(self.__entries),
+                'bytes': self.__total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def __remove(self, key: tuple):
+        """
+        Remove the entry. Must be called while holding the lock.
+
+        :param key: Key of the entry to remove
+        """
+        del self.__entries[key]
+        self.__total_bytes -= self.__sizes.pop(key)
+
+
+# Shared by every calculation in the process and emptied whenever the game data changes
+cache = ResultCache(int(os.getenv('ER_RESULT_CACHE_ENTRIES', 1024)),
+                    int(os.getenv('ER_RESULT_CACHE_BYTES', 4 * 1024 * 1024)))
+game_data.store.add_listener(lambda snapshot: cache.clear())
+metrics.registry.add_gauge('result_cache_hits', lambda: cache.hits)
+metrics.registry.add_gauge('result_cache_misses', lambda: cache.misses)
@@ -0,0 +1,213 @@
+"""
+Search for the path which gives the best foods and drinks instead of scoring a given one
+"""
+
+import game_data
+import ingredient_index
+import path_calculator
+
+# Weights for Heal and SpRestore which can be chosen by name
+WEIGHTS = {
+    'heal': (1, 0),
+    'sp': (0, 1),
+    'both': (1, 1)
+}
+
+
+class RouteOptimizer:
+    def __init__(self, snapshot: game_data.GameDataSnapshot, result_count: int = 5):
+        """
+        Branch and bound search over every set of numbered areas
+
+        :param snapshot: Snapshot of the game data to search with
+        :param result_count: The number of items of each stat which count towards a route's score
+        """
+        # Public variables
+        self.result_count = result_count
+
+        # Private variables
+        self.__index = snapshot.ingredient_index
+        self.__area_masks = [self.__index.area_masks.get(area, 0) for area in ingredient_index.NUMBERED_AREAS]
+        self.__stat_values = {stat: self.__get_stat_values(snapshot, stat) for stat in ['Heal', 'SpRestore']}
+        self.__objectives = {}
+
+    def find_best_route(self, area_count: int, required: list = (), forbidden: list = (), heal_weight: float = 1,
+                        sp_weight: float = 1) -> tuple:
+        """
+        Find the areas to visit which give the highest weighted total of the best items
+
+        :param area_count: The number of areas to visit
+        :param required: Numbers of the areas which must be visited
+        :param forbidden: Numbers of the areas which can't be visited
+        :param heal_weight: Weight of the total Heal of the best foods
+        :param sp_weight: Weight of the total SpRestore of the best drinks
+        :return: The area numbers in order and the route's score, or None and -1 if no route is possible
+        """
+        weights = (heal_weight, sp_weight)
+        candidates = [area for area in range(len(ingredient_index.NUMBERED_AREAS))
+                      if area not in required and area not in forbidden]
+        remaining = area_count - len(set(required))
+        if remaining < 0 or remaining > len(candidates):
+            return None, -1
+
+        # Try the best areas first so good routes are found early and more branches are pruned
+        candidates.sort(key=lambda area: -self.__get_objective(self.__area_masks[area] |
+                                                               self.__index.always_available_mask, weights))
+        suffix_masks = [0] * (len(candidates) + 1)
+        for cnt in range(len(candidates) - 1, -1, -1):
+            suffix_masks[cnt] = suffix_masks[cnt + 1] | self.__area_masks[candidates[cnt]]
+
+        best = {'score': -1, 'areas': None}
+        available = self.__index.always_available_mask
+        for area in set(required):
+            available |= self.__area_masks[area]
+
+        def search(position: int, chosen: list, current_available: int, areas_left: int):
+            """
+            Either visit or skip the candidate at the position, pruning branches which can't beat the best route
+
+            :param position: Position of the next candidate to decide on
+            :param chosen: Candidates already chosen
+            :param current_available: Mask of the ingredients gathered from the chosen areas
+            :param areas_left: The number of areas still to choose
+            """
+            if areas_left == 0:
+                score = self.__get_objective(current_available, weights)
+                if score > best['score']:
+                    best['score'] = score
+                    best['areas'] = chosen
+                return
+
+            # Visiting every remaining candidate is the most which can be gathered from this branch
+            if len(candidates) - position < areas_left or \
+                    self.__get_objective(current_available | suffix_masks[position], weights) <= best['score']:
+                return
+
+            area = candidates[position]
+            search(position + 1, chosen + [area], current_available | self.__area_masks[area], areas_left - 1)
+            search(position + 1, chosen, current_available, areas_left)
+
+        search(0, [], available, remaining)
+        if best['areas'] is None:
+            return None, -1
+        return sorted(set(required) | set(best['areas'])), best['score']
+
+    def __get_objective(self, available: int, weights: tuple) -> float:
+        """
+        Get the weighted total of the best foods and drinks which can be made from the available ingredients
+
+        :param available: Mask of the ingredients which can be gathered
+        :param weights: Weight of Heal and SpRestore
+        """
+        key = (available, weights)
+        if key not in self.__objectives:
+            score = 0
+            for stat, weight in zip(['Heal', 'SpRestore'], weights):
+                if weight:
+                    score += weight * self.__get_best_total(available, stat)
+            self.__objectives[key] = score
+        return self.__objectives[key]
+
+    def __get_best_total(self, available: int, stat: str) -> int:
+        """
+        Add up the total value of the best items which can be made from the available ingredients
+
+        :param available: Mask of the ingredients which can be gathered
+        :param stat: The stat to compare
+        """
+        total = 0
+        found = 0
+        for value, item_id in self.__stat_values[stat]:
+            if self.__index.is_feasible(item_id, available):
+                total += value
+                found += 1
+                if found == self.result_count:
+                    break
+        return total
+
+    @staticmethod
+    def __get_stat_values(snapshot: game_data.GameDataSnapshot, stat: str) -> list:
+        """
+        Get the total value of every consumable with the stat, highest first
+
+        :param snapshot: Snapshot of the game data
+        :param stat: The stat to compare
+        """
+        items = snapshot.item_store
+        values = [(items.stats[stat][item_id] * snapshot.recipes.quantity[item_id], item_id)
+                  for item_id in snapshot.ingredient_index.consumables if items.has_stat(item_id, stat)]
+        return sorted(values, key=lambda value: -value[0])
+
+
+class RouteCalc:
+    def __init__(self, route_arguments: str):
+        """
+        Find the best route based on the arguments of the command
+
+        :param route_arguments: The number of areas followed by +area to require one, -area to forbid one and the
+                                stat to favour E.g. 4 +2 -14 heal
+        """
+        # Public variables
+        self.messages = {
+            'info': [],
+            'error': []
+        }
+
+        # Private variables
+        self.__route_arguments = route_arguments.split()
+        self.__area_count = None
+        self.__required = []
+        self.__forbidden = []
+        self.__weights = WEIGHTS['both']
+
+    def create_route(self):
+        """
+        Search for the best route and show the items for it
+        """
+        if self.parse_arguments():
+            snapshot = game_data.get_snapshot()
+            areas, _ = RouteOptimizer(snapshot).find_best_route(self.__area_count, self.__required,
+                                                                self.__forbidden, *self.__weights)
+            if areas is None:
+                self.messages['error'].append('No route matches the required and forbidden areas')
+                return self.messages
+
+            path_string = ' '.join(str(area) for area in areas)
+            area_names = ', '.join(ingredient_index.NUMBERED_AREAS[area] for area in areas)
+            self.messages['info'].append(f'**Best Route:** `!er {path_string}` ({area_names})')
+            path_messages = path_calculator.PathCalc(path_string, 'total').create_item_path()
+            self.messages['info'] += path_messages['info']
+            self.messages['error'] += path_messages['error']
+        return self.messages
+
+    def parse_arguments(self) -> bool:
+        """
+        Read the number of areas, required and forbidden areas and the weighting from the arguments
+        """
+        area_numbers = [str(cnt) for cnt in range(len(ingredient_index.NUMBERED_AREAS))]
+        for argument in self.__route_arguments:
+            if argument.lower() in WEIGHTS:
+                self.__weights = WEIGHTS[argument.lower()]
+            elif argument[:1] in ['+', '-'] and argument[1:] in area_numbers:
+                areas = self.__required if argument[0] == '+' else self.__forbidden
+                areas.append(int(argument[1:]))
+            elif argument.isdigit() and self.__area_count is None:
+                self.__area_count = int(argument)
+            else:
+                self.messages['error'].append(f'Unrecognized argument {argument}')
+
+        if self.__area_count is None or not 1 <= self.__area_count <= len(area_numbers):
+            self.messages['error'].append(f'Choose between 1 and {len(area_numbers)} areas to visit')
+        if set(self.__required) & set(self.__forbidden):
+            self.messages['error'].append('An area can\'t be both required and forbidden')
+        return len(self.messages['error']) == 0
+
+
+if __name__ == '__main__':
+    route_calc = RouteCalc('5 heal').create_route()
+    for message_type_main in route_calc:
+        for message_main in route_calc[message_type_main]:
+            if message_type_main == 'error':
+                print(f'ERROR - {message_main}')
+            else:
+                print(message_main)
@@ -0,0 +1,93 @@
+"""
+Run the bot across several processes, each handling a range of gateway shards, with one leader keeping the data fresh
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import game_data
+import main_bot
+import metrics
+import shared_snapshot
+
+from dotenv import load_dotenv
+
+# Seconds to wait before restarting a worker which stopped
+RESTART_DELAY = 60
+
+
+def get_shard_ranges(shard_count: int, process_count: int) -> list:
+    """
+    Split the shards as evenly as possible between the processes
+
+    :param shard_count: Total number of gateway shards
+    :param process_count: Number of worker processes
+    :return: List of the shard ids each process handles
+    """
+    process_count = min(process_count, shard_count)
+    return [list(range(shard_count * cnt // process_count, shard_count * (cnt + 1) // process_count))
+            for cnt in range(process_count)]
+
+
+def run_worker(worker_number: int, shard_ids: list, shard_count: int, poll_interval: float):
+    """
+    Follow the leader's snapshot and run the bot for the given shards
+
+    :param worker_number: Position of the worker, used to give each its own metrics port
+    :param shard_ids: Gateway shards this worker handles
+    :param shard_count: Total number of gateway shards
+    :param poll_interval: Seconds between checks for a new snapshot
+    """
+    load_dotenv()
+    shared_snapshot.SnapshotFollower(poll_interval=poll_interval).start()
+
+    # Before the leader has published anything, the data is loaded here since it can't be once the bot is running
+    game_data.get_snapshot()
+    if os.getenv('ER_METRICS_PORT'):
+        metrics.start_server(int(os.getenv('ER_METRICS_PORT')) + worker_number + 1,
+                             os.getenv('ER_METRICS_HOST', '127.0.0.1'))
+    main_bot.DiscordBot(shard_ids, shard_count)
+
+
+def run_leader(shard_count: int, process_count: int, poll_interval: float):
+    """
+    Refresh the game data, share it with the workers and restart any worker which stops
+
+    :param shard_count: Total number of gateway shards
+    :param process_count: Number of worker processes
+    :param poll_interval: Seconds between each worker's checks for a new snapshot
+    """
+    load_dotenv()
+
+    # Every snapshot is written out for the workers, starting with the first one loaded here
+    publisher = shared_snapshot.SnapshotPublisher()
+    game_data.store.add_listener(publisher.publish)
+    game_data.start_background_refresh()
+
+    # Spawned so the workers only have what they map from the shared files, not a copy of the leader's data
+    context = multiprocessing.get_context('spawn')
+    workers = {}
+    while True:
+        for worker_number, shard_ids in enumerate(get_shard_ranges(shard_count, process_count)):
+            if worker_number not in workers or not workers[worker_number].is_alive():
+                if worker_number in workers:
+                    print(f'Worker {worker_number} stopped with {workers[worker_number].exitcode}, restarting',
+                          file=sys.stderr)
+                workers[worker_number] = context.Process(target=run_worker, name=f'shard-worker-{worker_number}',
+                                                         args=(worker_number, shard_ids, shard_count,
+                                                               poll_interval))
+                workers[worker_number].start()
+        time.sleep(RESTART_DELAY)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the bot across several processes')
+    parser.add_argument('--shards', type=int, default=int(os.getenv('ER_SHARD_COUNT', 2)),
+                        help='Total number of gateway shards')
+    parser.add_argument('--processes', type=int, default=int(os.getenv('ER_SHARD_PROCESSES', os.cpu_count() or 1)),
+                        help='Number of worker processes, each handling a range of the shards')
+    parser.add_argument('--poll-interval', type=float, default=30, help='Seconds between checks for a new snapshot')
+    arguments = parser.parse_args()
+    run_leader(arguments.shards, arguments.processes, arguments.poll_interval)
@@ -0,0 +1,144 @@
+"""
+Share one copy of the game data between processes through memory mapped files, written by a single leader
+"""
+
+import glob
+import json
+import os
+import sys
+import threading
+import answer_table
+import disk_cache
+import game_data
+import snapshot_format
+
+# Names the current files, written last so followers never see a half written version
+MANIFEST_FILE = disk_cache.get_cache_file('shared_snapshot.json')
+
+# Number of published versions kept on disk, older ones may still be mapped by slow followers
+KEPT_VERSIONS = 3
+
+
+class SnapshotPublisher:
+    def __init__(self, manifest_file: str = MANIFEST_FILE):
+        """
+        Write every snapshot the leader publishes to versioned files and point the manifest at them
+
+        :param manifest_file: Path of the manifest, the data files are written next to it
+        """
+        # Public variables
+        self.manifest_file = manifest_file
+        self.published = 0
+
+        # Private variables
+        self.__prefixes = []
+        self.__lock = threading.Lock()
+
+    def publish(self, snapshot: game_data.GameDataSnapshot):
+        """
+        Write the snapshot and its answer table then swap the manifest over to them
+
+        :param snapshot: The snapshot to share
+        """
+        with self.__lock:
+            self.published += 1
+            prefix = f'{os.path.splitext(self.manifest_file)[0]}-{os.getpid()}-{self.published}'
+            manifest = {'version': self.published, 'leader': os.getpid(), 'snapshot': f'{prefix}.snap'}
+            snapshot_format.save_snapshot(snapshot.all_info, manifest['snapshot'])
+            if snapshot.answer_table is not None:
+                manifest['answers'] = f'{prefix}.answers'
+                snapshot.answer_table.save(manifest['answers'])
+
+            with disk_cache.atomic_write(self.manifest_file) as output_file:
+                json.dump(manifest, output_file)
+            self.__remove_old_versions(prefix)
+
+    def __remove_old_versions(self, current_prefix: str):
+        """
+        Delete the files of older versions beyond the ones being kept, along with any left by an earlier leader
+
+        :param current_prefix: Prefix of the files just published
+        """
+        if not self.__prefixes:
+            base = os.path.splitext(self.manifest_file)[0]
+            self.__prefixes = sorted({os.path.splitext(file_name)[0] for file_name in glob.glob(f'{base}-*-*.*')
+                                      if not file_name.endswith('.tmp')} - {current_prefix})
+        self.__prefixes.append(current_prefix)
+
+        while len(self.__prefixes) > KEPT_VERSIONS:
+            for file_name in glob.glob(f'{self.__prefixes.pop(0)}.*'):
+
+                # Windows won't delete a file another process still has mapped, so it is left behind
+                try:
+                    os.remove(file_name)
+                except OSError:
+                    pass
+
+
+class SnapshotFollower:
+    def __init__(self, manifest_file: str = MANIFEST_FILE, poll_interval: float = 30):
+        """
+        Load each version the leader publishes into this process's game data store
+
+        :param manifest_file: Path of the manifest written by the leader
+        :param poll_interval: Seconds between checks for a new version
+        """
+        # Public variables
+        self.manifest_file = manifest_file
+        self.poll_interval = poll_interval
+        self.version = None
+
+        # Private variables
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    def check(self) -> bool:
+        """
+        Load the published version if it is newer than the one already loaded
+
+        :return: True if a new version was loaded
+        """
+        if not os.path.isfile(self.manifest_file):
+            return False
+        with open(self.manifest_file, 'r') as input_file:
+            manifest = json.load(input_file)
+        version = (manifest['leader'], manifest['version'])
+        if version == self.version:
+            return False
+
+        all_info = snapshot_format.read_snapshot(manifest['snapshot'])
+        answers = answer_table.load_answer_table(manifest['answers']) if 'answers' in manifest else None
+        game_data.store.load(all_info, answers)
+        self.version = version
+        return True
+
+    def start(self):
+        """
+        Load the current version and keep checking for new ones in the background
+        """
+        self.check()
+        if self.__thread is None:
+            self.__stop_event.clear()
+            self.__thread = threading.Thread(target=self.__follow_loop, name='snapshot-follower', daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        """
+        Stop checking for new versions
+        """
+        self.__stop_event.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __follow_loop(self):
+        """
+        Check for a new version every poll interval
+        """
+        while not self.__stop_event.wait(self.poll_interval):
+
+            # Keep serving the loaded version if the new one can't be read
+            try:
+                self.check()
+            except (OSError, ValueError, KeyError) as error:
+                print(f'Unable to load the shared snapshot: {error}', file=sys.stderr)
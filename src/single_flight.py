@@ -0,0 +1,93 @@
+"""
+Share one in flight call between everyone asking for the same thing at the same time
+"""
+
+import asyncio
+import threading
+
+
+class Call:
+    def __init__(self):
+        """
+        Result of a call which other threads may be waiting on
+        """
+        # Public variables
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Run only one call for each key at a time across threads, giving its result to every caller waiting on it
+        """
+        # Public variables
+        self.shared = 0
+
+        # Private variables
+        self.__calls = {}
+        self.__lock = threading.Lock()
+
+    def run(self, key: object, function: callable):
+        """
+        Run the function unless a call with the same key is already in flight, in which case wait for that one
+
+        :param key: Identifies calls which would give the same result
+        :param function: Function to run if no call with the key is in flight
+        :return: The result of the function, raising its error if it failed
+        """
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.__calls[key] = Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    def __init__(self):
+        """
+        Run only one coroutine for each key at a time on the event loop, giving its result to every caller awaiting it
+        """
+        # Public variables
+        self.shared = 0
+
+        # Private variables
+        self.__tasks = {}
+
+    async def run(self, key: object, function: callable):
+        """
+        Start the coroutine unless one with the same key is already in flight, in which case await that one
+
+        :param key: Identifies calls which would give the same result
+        :param function: Function returning the coroutine to run if none with the key is in flight
+        :return: The result of the coroutine, raising its error if it failed
+        """
+        task = self.__tasks.get(key)
+        if task is None:
+            task = self.__tasks[key] = asyncio.ensure_future(function())
+            task.add_done_callback(lambda finished_task: self.__tasks.pop(key, None))
+        else:
+            self.shared += 1
+
+        # Shielded so one caller giving up doesn't cancel the result for the others
+        return await asyncio.shield(task)
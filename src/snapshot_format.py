@@ -0,0 +1,289 @@
+"""
+Compact binary format for the api results which only keeps the fields the calculations use:
+Name, ItemType, Heal, SpRestore, Material1, Material2, InitialCount and each area's drop counts, along with the optional
+character stats as json
+"""
+
+import collections.abc
+import disk_cache
+import json
+import mmap
+import struct
+import sys
+
+# Identifies the file and the layout of its sections
+MAGIC = b'ERSN'
+FORMAT_VERSION = 2
+
+# Item fields saved in the snapshot, any others are dropped
+ITEM_FIELDS = ['Name', 'ItemType', 'Heal', 'SpRestore', 'Material1', 'Material2', 'InitialCount']
+
+# Number of entries at the start of a section or table
+COUNT = struct.Struct('<I')
+
+# Magic, format version, timestamp and the offsets of the string, item, area and character sections
+HEADER = struct.Struct('<4sHxxqIIII')
+
+# Name, item type, heal, sp restore, material 1, material 2 and initial count
+ITEM_RECORD = struct.Struct('<IIiiIIi')
+
+# Item name and drop count for one item in an area
+DROP_RECORD = struct.Struct('<IH')
+
+# Stored in place of an empty stat or material
+NO_VALUE = -1
+NO_STRING = 0xFFFFFFFF
+
+
+class BinarySnapshot:
+    def __init__(self, file_name: str):
+        """
+        Memory map a binary snapshot, only decoding each section the first time it is used. The file is unmapped
+        once every section has been decoded, so it can be replaced on Windows.
+
+        :param file_name: Path of the snapshot file
+        """
+        with open(file_name, 'rb') as input_file:
+            self.__buffer = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.timestamp, self.__strings_offset, self.__items_offset, self.__areas_offset, \
+            self.__characters_offset = HEADER.unpack_from(self.__buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.__buffer.close()
+            raise ValueError(f'{file_name} is not a version {FORMAT_VERSION} snapshot')
+
+        # Public variables
+        self.items = LazySection(self.__decode_items)
+        self.areas = LazySection(self.__decode_areas)
+        self.characters = LazySection(self.__decode_characters)
+
+        # Private variables
+        self.__string_count = COUNT.unpack_from(self.__buffer, self.__strings_offset)[0]
+        self.__strings = {}
+        self.__undecoded = 3
+
+    def get_all_info(self) -> dict:
+        """
+        Get the snapshot in the same format as EternalReturnApi.all_info_dict
+        """
+        return {
+            'items': self.items,
+            'areas': self.areas,
+            'characters': self.characters,
+            '__timestamp': self.timestamp
+        }
+
+    def close(self):
+        """
+        Unmap the file, only the sections which have already been decoded can be used afterwards
+        """
+        self.__buffer.close()
+        self.__strings = {}
+
+    def __section_decoded(self):
+        """
+        Count a section as decoded, closing the file once nothing else needs it
+        """
+        self.__undecoded -= 1
+        if self.__undecoded == 0:
+            self.close()
+
+    def __get_string(self, string_id: int) -> str:
+        """
+        Decode a string from the string table the first time it is needed
+
+        :param string_id: Position of the string in the table
+        """
+        if string_id == NO_STRING:
+            return ''
+        if string_id not in self.__strings:
+            table_offset = self.__strings_offset + COUNT.size
+            start, end = struct.unpack_from('<II', self.__buffer, table_offset + string_id * COUNT.size)
+            data_offset = table_offset + (self.__string_count + 1) * COUNT.size
+            self.__strings[string_id] = sys.intern(self.__buffer[data_offset + start:data_offset + end].decode())
+        return self.__strings[string_id]
+
+    def __decode_items(self) -> dict:
+        """
+        Decode every item record
+        """
+        items = {}
+        item_count = COUNT.unpack_from(self.__buffer, self.__items_offset)[0]
+        for record in ITEM_RECORD.iter_unpack(self.__buffer[self.__items_offset + COUNT.size:
+                                                              self.__items_offset + COUNT.size +
+                                                              item_count * ITEM_RECORD.size]):
+            name, item_type, heal, sp_restore, material_1, material_2, initial_count = record
+            items[self.__get_string(name)] = {
+                'Name': self.__get_string(name),
+                'ItemType': self.__get_string(item_type),
+                'Heal': '' if heal == NO_VALUE else heal,
+                'SpRestore': '' if sp_restore == NO_VALUE else sp_restore,
+                'Material1': self.__get_string(material_1),
+                'Material2': self.__get_string(material_2),
+                'InitialCount': initial_count
+            }
+        self.__section_decoded()
+        return items
+
+    def __decode_areas(self) -> dict:
+        """
+        Decode the drop counts of every area
+        """
+        areas = {}
+        offset = self.__areas_offset
+        area_count = COUNT.unpack_from(self.__buffer, offset)[0]
+        offset += COUNT.size
+        for _ in range(area_count):
+            area_name, drop_count = struct.unpack_from('<II', self.__buffer, offset)
+            offset += 2 * COUNT.size
+            drops = self.__buffer[offset:offset + drop_count * DROP_RECORD.size]
+            areas[self.__get_string(area_name)] = {self.__get_string(item): count
+                                                  for item, count in DROP_RECORD.iter_unpack(drops)}
+            offset += drop_count * DROP_RECORD.size
+        self.__section_decoded()
+        return areas
+
+    def __decode_characters(self) -> dict:
+        """
+        Decode the stats of every character
+        """
+        length = COUNT.unpack_from(self.__buffer, self.__characters_offset)[0]
+        start = self.__characters_offset + COUNT.size
+        characters = json.loads(self.__buffer[start:start + length].decode())
+        self.__section_decoded()
+        return characters
+
+
+# noinspection PyMissingOrEmptyDocstring
+class LazySection(collections.abc.Mapping):
+    def __init__(self, decode: callable):
+        """
+        Read only mapping which is decoded the first time it is used
+
+        :param decode: Function returning the decoded dictionary
+        """
+        self.__decode = decode
+        self.__decoded = None
+
+    def __get_decoded(self) -> dict:
+        if self.__decoded is None:
+            self.__decoded = self.__decode()
+
+            # Let go of the snapshot so its file can be closed
+            self.__decode = None
+        return self.__decoded
+
+    def __getitem__(self, key):
+        return self.__get_decoded()[key]
+
+    def __iter__(self):
+        return iter(self.__get_decoded())
+
+    def __len__(self):
+        return len(self.__get_decoded())
+
+    def __contains__(self, key):
+        return key in self.__get_decoded()
+
+
+def read_snapshot(file_name: str) -> dict:
+    """
+    Decode every section of a binary snapshot straight away and close the file, for data which is kept around
+
+    :param file_name: Path of the snapshot file
+    :return: Dictionary in the same format as EternalReturnApi.all_info_dict
+    """
+    all_info = BinarySnapshot(file_name).get_all_info()
+    for section in ['items', 'areas', 'characters']:
+        all_info[section] = dict(all_info[section])
+    return all_info
+
+
+def save_snapshot(all_info: dict, file_name: str):
+    """
+    Save the api results as a binary snapshot
+
+    :param all_info: Dictionary in the same format as EternalReturnApi.all_info_dict
+    :param file_name: Path of the snapshot file
+    """
+    strings = {}
+
+    def get_string_id(string: str) -> int:
+        if string == '':
+            return NO_STRING
+        if string not in strings:
+            strings[string] = len(strings)
+        return strings[string]
+
+    items = bytearray(COUNT.pack(len(all_info['items'])))
+    for name, item in all_info['items'].items():
+        items += ITEM_RECORD.pack(get_string_id(name), get_string_id(item['ItemType']),
+                                  NO_VALUE if item['Heal'] == '' else item['Heal'],
+                                  NO_VALUE if item['SpRestore'] == '' else item['SpRestore'],
+                                  get_string_id(item['Material1']), get_string_id(item['Material2']),
+                                  item['InitialCount'])
+
+    areas = bytearray(COUNT.pack(len(all_info['areas'])))
+    for area, drops in all_info['areas'].items():
+        areas += struct.pack('<II', get_string_id(area), len(drops))
+        for item, count in drops.items():
+            areas += DROP_RECORD.pack(get_string_id(item), count)
+
+    # Characters have too many fields to give them records and aren't used in the calculations, so they stay json
+    characters = json.dumps(dict(all_info.get('characters', {}))).encode()
+    characters = COUNT.pack(len(characters)) + characters
+
+    # Offsets of each string followed by all of the string data
+    encoded = [string.encode() for string in strings]
+    string_offsets = [0]
+    for string in encoded:
+        string_offsets.append(string_offsets[-1] + len(string))
+    string_table = COUNT.pack(len(encoded)) + struct.pack(f'<{len(string_offsets)}I', *string_offsets) + \
+        b''.join(encoded)
+
+    strings_offset = HEADER.size
+    items_offset = strings_offset + len(string_table)
+    areas_offset = items_offset + len(items)
+    characters_offset = areas_offset + len(areas)
+
+    # Replace the file in one step since other processes may have the old one memory mapped
+    with disk_cache.atomic_write(file_name, 'wb') as output_file:
+        output_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, all_info['__timestamp'], strings_offset, items_offset,
+                                      areas_offset, characters_offset))
+        output_file.write(string_table)
+        output_file.write(items)
+        output_file.write(areas)
+        output_file.write(characters)
+
+
+def import_json(json_file_name: str, file_name: str):
+    """
+    Create a binary snapshot from the json api results
+
+    :param json_file_name: Path of the json file
+    :param file_name: Path of the snapshot file
+    """
+    with open(json_file_name, 'r') as input_file:
+        save_snapshot(json.load(input_file), file_name)
+
+
+def export_json(file_name: str, json_file_name: str):
+    """
+    Write the fields kept in a binary snapshot back out as json
+
+    :param file_name: Path of the snapshot file
+    :param json_file_name: Path of the json file
+    """
+    all_info = read_snapshot(file_name)
+    with open(json_file_name, 'w') as output_file:
+        json.dump(all_info, output_file)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] not in ['import', 'export']:
+        print('Usage: snapshot_format.py import [json file] [snapshot file]\n'
+              '       snapshot_format.py export [snapshot file] [json file]')
+    elif sys.argv[1] == 'import':
+        import_json(sys.argv[2], sys.argv[3])
+    else:
+        export_json(sys.argv[2], sys.argv[3])
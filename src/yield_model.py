@@ -0,0 +1,126 @@
+"""
+Estimate how much of each food and drink a path really gives, by simulating the loot picked up from each area's drops
+"""
+
+import numpy
+import ingredient_index
+import item_store
+import recipe_compiler
+
+# Share of each area's drops a player picks up on average while passing through
+SEARCH_RATE = 0.5
+
+# Number of each start ingredient given at the start of the game, on top of any found along the path
+START_COUNT = 2
+
+# Percentiles of the simulated totals shown as the confidence band
+BAND_PERCENTILES = (10, 90)
+
+
+class YieldModel:
+    def __init__(self, items: item_store.ItemStore, recipes: recipe_compiler.CompiledRecipes,
+                 index: ingredient_index.IngredientIndex, areas: dict, search_rate: float = SEARCH_RATE,
+                 simulations: int = 500):
+        """
+        Arrays of the drop counts of every numbered area and the ingredients each consumable needs
+
+        :param items: Store of every item
+        :param recipes: Compiled recipes for the same items
+        :param index: Ingredient index for the same items and areas, whose bits are used as the ingredient columns
+        :param areas: Dictionary of the items spawning in each area keyed by the area name
+        :param search_rate: Share of each area's drops which is picked up
+        :param simulations: Number of loot rolls simulated for each path
+        """
+        # Public variables
+        self.search_rate = search_rate
+        self.simulations = simulations
+
+        # Private variables
+        self.__items = items
+        self.__recipes = recipes
+        self.__rows = {item_id: row for row, item_id in enumerate(index.consumables)}
+        self.__area_drops = numpy.zeros((len(ingredient_index.NUMBERED_AREAS), len(index.ingredients) + 1),
+                                        numpy.int64)
+        self.__start_counts = numpy.zeros(len(index.ingredients) + 1, numpy.int64)
+        self.__leaf_columns = None
+        self.__leaf_needs = None
+
+        self.__build(index, areas)
+
+    def estimate(self, candidates: list, area_subset: int, stat: str) -> dict:
+        """
+        Simulate the loot of the path and get the expected total of each candidate along with its confidence band
+
+        :param candidates: Ids of the consumables to estimate
+        :param area_subset: Mask with the bit of each area number visited set
+        :param stat: The stat to total
+        :return: Dictionary of each candidate to its expected total and the low and high ends of its band
+        """
+        if not candidates:
+            return {}
+
+        # Only the ingredients the candidates need are rolled, with each leaf pointing at its rolled column
+        rows = [self.__rows[item_id] for item_id in candidates]
+        needed, positions = numpy.unique(self.__leaf_columns[rows].ravel(), return_inverse=True)
+        positions = positions.reshape(len(rows), -1)
+
+        # The areas of a path add up to a single roll for each ingredient, seeded by the path so repeats match
+        visited = [number for number in range(len(ingredient_index.NUMBERED_AREAS)) if area_subset >> number & 1]
+        drops = self.__area_drops[visited][:, needed].sum(axis=0)
+        generator = numpy.random.default_rng(area_subset)
+        gathered = generator.binomial(drops, self.search_rate, (self.simulations, len(needed))) + \
+            self.__start_counts[needed]
+
+        # Each full set of leaves crafts the item's quantity, and the scarcest leaf decides how many sets there are
+        sets = (gathered[:, positions] // self.__leaf_needs[rows]).min(axis=2)
+        per_set = numpy.array([self.__recipes.quantity[item_id] * max(0, self.__items.stats[stat][item_id])
+                               for item_id in candidates])
+        totals = sets * per_set
+        means = totals.mean(axis=0)
+        lows, highs = numpy.percentile(totals, BAND_PERCENTILES, axis=0)
+        return {item_id: (float(means[cnt]), float(lows[cnt]), float(highs[cnt]))
+                for cnt, item_id in enumerate(candidates)}
+
+    def rank(self, candidates: list, area_subset: int, stat: str, result_count: int) -> tuple:
+        """
+        Get the crafted candidates with the highest expected totals, breaking ties by the low end of their band
+
+        Anything which isn't crafted is left out E.g. Meat, since what is picked up goes into crafting the others.
+
+        :param candidates: Ids of the consumables to rank
+        :param area_subset: Mask with the bit of each area number visited set
+        :param stat: The stat to total
+        :param result_count: The number of items to return
+        :return: Ids of the best items in order and the estimate of every crafted candidate
+        """
+        crafted = [item_id for item_id in candidates if self.__recipes.is_crafted(item_id)]
+        estimates = self.estimate(crafted, area_subset, stat)
+        best = sorted(crafted, key=lambda item_id: estimates[item_id][:2], reverse=True)[:result_count]
+        return best, estimates
+
+    def __build(self, index: ingredient_index.IngredientIndex, areas: dict):
+        """
+        Fill in the drop counts and the leaf columns of every consumable
+
+        :param index: Ingredient index for the same items and areas
+        :param areas: Dictionary of the items spawning in each area keyed by the area name
+        """
+        for number, area in enumerate(ingredient_index.NUMBERED_AREAS):
+            for name, drop_count in areas.get(area, {}).items():
+                item_id = self.__items.ids.get(name)
+                if item_id in index.bits:
+                    self.__area_drops[number, index.bits[item_id]] += drop_count
+        for item_id in index.start_ingredients:
+            if item_id in index.bits:
+                self.__start_counts[index.bits[item_id]] = START_COUNT
+
+        # A final column which always has plenty pads recipes to the most leaves of any consumable
+        self.__start_counts[-1] = numpy.iinfo(numpy.int32).max
+        leaf_counts = [self.__recipes.leaf_counts[item_id] for item_id in index.consumables]
+        width = max((len(counts) for counts in leaf_counts), default=1)
+        self.__leaf_columns = numpy.full((len(leaf_counts), width), len(index.ingredients), numpy.intp)
+        self.__leaf_needs = numpy.ones((len(leaf_counts), width), numpy.int64)
+        for row, counts in enumerate(leaf_counts):
+            for cnt, (leaf, count) in enumerate(counts.items()):
+                self.__leaf_columns[row, cnt] = index.bits[leaf]
+                self.__leaf_needs[row, cnt] = count